@@ -51,23 +51,26 @@ Usage (CLI):
         --output Engagement_Summary_FY26.xlsx \
         --print-markdown
 
-Requires: pandas (with openpyxl engine), numpy.
+Requires: pandas (with openpyxl engine), numpy, xlsxwriter.
 """
 
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import xlsxwriter
 from openpyxl import load_workbook
-from openpyxl.formatting.rule import CellIsRule
-from openpyxl.styles import PatternFill
-from openpyxl.utils import get_column_letter
+from xlsxwriter.utility import xl_range
 
 
 def parse_date_safe(s: pd.Series) -> pd.Series:
-    return pd.to_datetime(s, errors='coerce')
+    # Date cells read from the workbook usually arrive already typed; only text needs parsing
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    return pd.to_datetime(s, errors='coerce', cache=True)
 
 
 def parse_billings(s: str) -> float:
@@ -77,24 +80,37 @@ def parse_billings(s: str) -> float:
     return float(t)
 
 
-def detect_header_row(df_raw: pd.DataFrame) -> Optional[int]:
-    for i in range(len(df_raw)):
-        row_vals = df_raw.iloc[i].astype(str).tolist()
-        if 'Opportunity ID' in row_vals and 'Engagement ID' in row_vals:
-            return i
-    return None
+# Auto-detection only looks at the top of the sheet; a deeper header needs --header-row-index
+HEADER_SCAN_ROWS = 30
+
+
+def is_header_row(row_vals) -> bool:
+    return 'Opportunity ID' in row_vals and 'Engagement ID' in row_vals
 
 
 def load_detail_frame(input_file: str, sheet_name: str, header_row_index: Optional[int]) -> pd.DataFrame:
-    raw = pd.read_excel(input_file, sheet_name=sheet_name, header=None, engine='openpyxl')
-    if header_row_index is None:
-        header_row_index = detect_header_row(raw)
-        if header_row_index is None:
+    """Stream the Detail sheet in read-only mode: locate the header row, then collect the rows below it."""
+    wb = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        headers = None
+        for i, row_vals in enumerate(rows):
+            if header_row_index is None and i >= HEADER_SCAN_ROWS:
+                break
+            found = (i == header_row_index) if header_row_index is not None else is_header_row(row_vals)
+            if found:
+                headers = list(row_vals)
+                break
+        if headers is None:
             raise ValueError('Header row not found. Provide --header-row-index or ensure the sheet contains the expected headers.')
-    headers = raw.iloc[header_row_index].tolist()
-    df = raw.iloc[header_row_index + 1:].copy()
-    df.columns = headers
-    return df
+        data = list(rows)
+    finally:
+        wb.close()
+
+    # Drop trailing blank rows (formatted but empty cells at the end of the sheet)
+    while data and all(v is None for v in data[-1]):
+        data.pop()
+    return pd.DataFrame(data, columns=headers)
 
 
 def filter_fiscal_year(df: pd.DataFrame, fy_start: pd.Timestamp, fy_end: pd.Timestamp) -> pd.DataFrame:
@@ -103,61 +119,99 @@ def filter_fiscal_year(df: pd.DataFrame, fy_start: pd.Timestamp, fy_end: pd.Time
             df[c] = pd.NaT
     df['Accounting Date'] = parse_date_safe(df['Accounting Date'])
     df['Transaction Date'] = parse_date_safe(df['Transaction Date'])
-    mask = (
-        (df['Accounting Date'].notna() & (df['Accounting Date'] >= fy_start) & (df['Accounting Date'] <= fy_end)) |
-        (df['Accounting Date'].isna() & df['Transaction Date'].notna() & (df['Transaction Date'] >= fy_start) & (df['Transaction Date'] <= fy_end))
-    )
-    return df.loc[mask].copy()
+    # Build the mask on the raw datetime64 arrays, reusing two buffers; NaT never compares true,
+    # so the notna() checks are implicit
+    acc = df['Accounting Date'].to_numpy(dtype='datetime64[ns]')
+    tx = df['Transaction Date'].to_numpy(dtype='datetime64[ns]')
+    start = fy_start.to_datetime64().astype('datetime64[ns]')
+    end = fy_end.to_datetime64().astype('datetime64[ns]')
+    mask = acc >= start
+    mask &= acc <= end
+    by_tx = np.isnat(acc)
+    by_tx &= tx >= start
+    by_tx &= tx <= end
+    mask |= by_tx
+    # Callers only read the FY slice, so no defensive copy
+    return df.loc[mask]
 
 
 def coerce_numeric(df: pd.DataFrame, cols) -> pd.DataFrame:
     for c in cols:
         if c not in df.columns:
             df[c] = 0
-        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+            continue
+        col = df[c]
+        # Columns read as numbers only need their blanks zeroed; text columns go through to_numeric.
+        # Amounts stay float64: float32 cannot hold cents once FY totals reach the millions.
+        if not pd.api.types.is_numeric_dtype(col):
+            col = pd.to_numeric(col, errors='coerce')
+        if col.hasnans:
+            col = col.fillna(0)
+        df[c] = col
+    return df
+
+
+def pct_of(part: np.ndarray, whole: np.ndarray) -> np.ndarray:
+    """part / whole * 100, NaN where whole is zero."""
+    pct = np.divide(part, whole, out=np.full_like(whole, np.nan), where=whole != 0)
+    pct *= 100
+    return pct
+
+
+def round_float_columns(df: pd.DataFrame, decimals: int = 2) -> None:
+    """Round float columns in place; unlike DataFrame.round this leaves text columns untouched."""
+    for c in df.columns[[pd.api.types.is_float_dtype(t) for t in df.dtypes]]:
+        df[c] = np.round(df[c].to_numpy(), decimals)
+
+
+SHORE_SWAP = {'Offshore': 'Onshore', 'Onshore': 'Offshore'}
+
+
+def add_engagement_codes(df: pd.DataFrame) -> pd.DataFrame:
+    """Factorize Engagement ID once into an int32 '_eid' column (-1 for blank IDs)."""
+    codes, _ = pd.factorize(df['Engagement ID'])
+    df['_eid'] = codes.astype('int32')
     return df
 
 
 def engagement_summary(df: pd.DataFrame,
                       partners: Optional[pd.DataFrame] = None,
                       nui_etd: Optional[pd.DataFrame] = None) -> pd.DataFrame:
-    grp = df.groupby(['Engagement ID', 'Engagement Name']).agg({
+    sums = {
         'ANSR / Tech Revenue': 'sum',
         'Margin Cost': 'sum',
         'Expense Amount': 'sum',
         'Charged Hours / Quantity': 'sum'
-    }).reset_index()
+    }
+    if '_eid' in df.columns:
+        # Hash the int32 codes from add_engagement_codes rather than the ID strings; blank IDs
+        # (code -1) are dropped just as groupby drops NaN keys
+        grp = df.groupby(['_eid', 'Engagement Name']).agg({'Engagement ID': 'first', **sums}).reset_index()
+        grp = grp[grp['_eid'] >= 0].drop(columns='_eid')
+    else:
+        grp = df.groupby(['Engagement ID', 'Engagement Name']).agg(sums).reset_index()
     grp.rename(columns={'Charged Hours / Quantity': 'Hours'}, inplace=True)
     
-    grp['TER'] = grp['ANSR / Tech Revenue'] + grp['Expense Amount']
-    grp['Margin Amount'] = grp['ANSR / Tech Revenue'] - grp['Margin Cost']
-    grp['Margin %'] = np.where(grp['ANSR / Tech Revenue'] != 0,
-                               (grp['Margin Amount'] / grp['ANSR / Tech Revenue']) * 100,
-                               np.nan)
+    ansr = grp['ANSR / Tech Revenue'].to_numpy(dtype=float)
+    margin = ansr - grp['Margin Cost'].to_numpy(dtype=float)
+    grp['TER'] = ansr + grp['Expense Amount'].to_numpy(dtype=float)
+    grp['Margin Amount'] = margin
+    grp['Margin %'] = pct_of(margin, ansr)
     
     # Merge with Engagement Partner if available (after all calculations)
     if partners is not None:
-        grp = grp.merge(partners, on='Engagement ID', how='left')
-
-        # Fill in blank Engagement Partners by finding similar engagement names
-        for idx, row in grp.iterrows():
-            if pd.isna(row['Engagement Partner']) and row['Engagement Name']:
-                eng_name = row['Engagement Name']
-                if 'Offshore' in eng_name:
-                    similar_name = eng_name.replace('Offshore', 'Onshore')
-                elif 'Onshore' in eng_name:
-                    similar_name = eng_name.replace('Onshore', 'Offshore')
-                else:
-                    similar_name = None
-
-                if similar_name:
-                    match = grp[grp['Engagement Name'] == similar_name]
-                    if not match.empty and pd.notna(match['Engagement Partner'].iloc[0]):
-                        grp.at[idx, 'Engagement Partner'] = match['Engagement Partner'].iloc[0]
+        grp = grp.merge(partners, on='Engagement ID', how='left', validate='many_to_one')
+
+        # Fill in blank Engagement Partners from the sibling Offshore/Onshore engagement
+        names = grp['Engagement Name']
+        swapped = names.str.replace(r'Offshore|Onshore', lambda m: SHORE_SWAP[m.group(0)], regex=True)
+        sibling = swapped.where(swapped != names)
+        first_partner = grp.drop_duplicates(subset=['Engagement Name']).set_index('Engagement Name')['Engagement Partner']
+        grp['Engagement Partner'] = grp['Engagement Partner'].fillna(sibling.map(first_partner))
 
     # Merge NUI ETD + BoB partner if available
     if nui_etd is not None:
-        grp = grp.merge(nui_etd, on='Engagement ID', how='left')
+        grp = grp.merge(nui_etd, on='Engagement ID', how='left', validate='many_to_one')
 
     # Backfill Engagement Partner from BoB if missing
     if 'Engagement Partner' in grp.columns and 'Engagement Partner (BoB)' in grp.columns:
@@ -179,254 +233,170 @@ def engagement_summary(df: pd.DataFrame,
     # Ensure we don't leak the BoB helper column
     grp = grp[[c for c in cols if c in grp.columns]]
     
-    grp = grp.round(2).sort_values(by='TER', ascending=False)
-    return grp
-
-
-def add_totals_and_format(ws) -> None:
-    """Add totals row and apply comprehensive Excel formatting."""
-    from openpyxl.styles import Font, Alignment, Border, Side
-    
-    headers = [cell.value for cell in ws[1]]
-    last_row = ws.max_row
-    ws.cell(row=last_row + 1, column=1).value = 'TOTAL'
-    eng_numeric_cols = ['ANSR / Tech Revenue', 'Margin Cost', 'Margin Amount', 'TER', 'Hours', 'NUI ETD']
-    for col_name in eng_numeric_cols:
-        if col_name in headers:
-            col_idx = headers.index(col_name) + 1
-            col_letter = get_column_letter(col_idx)
-            start_cell = f'{col_letter}2'
-            end_cell = f'{col_letter}{last_row}'
-            ws.cell(row=last_row + 1, column=col_idx).value = f'=SUBTOTAL(9,{start_cell}:{end_cell})'
-
-    if 'NUI ETD' in headers:
-        col_idx = headers.index('NUI ETD') + 1
-        col_letter = get_column_letter(col_idx)
-        data_range = f'{col_letter}2:{col_letter}{last_row}'
-        red_fill = PatternFill(start_color='FFFFC7CE', end_color='FFFFC7CE', fill_type='solid')
-        green_fill = PatternFill(start_color='FFC6EFCE', end_color='FFC6EFCE', fill_type='solid')
-        ws.conditional_formatting.add(data_range, CellIsRule(operator='greaterThan', formula=['0'], fill=red_fill))
-        ws.conditional_formatting.add(data_range, CellIsRule(operator='lessThan', formula=['0'], fill=green_fill))
-
-
-def format_engagement_summary_sheet(ws) -> None:
-    """Apply comprehensive formatting to Engagement Summary sheets."""
-    from openpyxl.styles import Font, Alignment, Border, Side
-    
-    # Define column widths for Engagement Summary
-    column_widths = {
-        'Engagement ID': 16.43,
-        'Engagement Name': 48.14,
-        'ANSR / Tech Revenue': 23.57,
-        'Margin Cost': 16.86,
-        'Margin Amount': 18.43,
-        'TER': 16.86,
-        'Margin %': 11.43,
-        'Hours': 13.0,
-        'Engagement Partner': 21.14,
-        'Engagement Manager': 22.43,
-        'Engagement Status': 20.0,
-        'NUI ETD': 14.29
-    }
-    
-    # Define number formats
-    money_format = '_-"$"* #,##0.00_-;\\-"$"* #,##0.00_-;_-"$"* "-"??_-;_-@_-'
-    
-    # Get headers
-    headers = [cell.value for cell in ws[1]]
-    
-    # Format header row
-    thin_border = Border(bottom=Side(style='thin'))
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_idx)
-        cell.font = Font(bold=True, size=11, name='Calibri')
-        cell.alignment = Alignment(horizontal='center', vertical='top')
-        cell.border = thin_border
-        
-        # Set column width
-        col_letter = get_column_letter(col_idx)
-        if header in column_widths:
-            ws.column_dimensions[col_letter].width = column_widths[header]
-    
-    # Format data rows
-    last_row = ws.max_row
-    for row_idx in range(2, last_row + 1):
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            # Apply number formatting
-            if header in ['ANSR / Tech Revenue', 'Margin Cost', 'Margin Amount', 'TER', 'NUI ETD']:
-                cell.number_format = money_format
-
-
-def format_employee_summary_sheet(ws) -> None:
-    """Apply comprehensive formatting to Employee Summary sheet."""
-    from openpyxl.styles import Font, Alignment, Border, Side
-    
-    # Define column widths for Employee Summary
-    column_widths = {
-        'Employee / Product Name': 37.29,
-        'Employee GUI / Product ID': 26.71,
-        'Rank / Method': 17.43,
-        'Grade': 8.57,
-        'Employee Region': 18.57,
-        'Country / Region': 18.0,
-        'Service Line': 13.71,
-        'Hours': 9.14,
-        'NSR': 16.86,
-        'ANSR': 13.0,
-        'Margin Cost': 13.0,
-        'Expense Amount': 19.57,
-        '#Engagements': 16.0,
-        '#Opportunities': 16.57,
-        'TER': 16.86,
-        'Margin Amount': 18.43,
-        'Margin % (on ANSR)': 20.86,
-        'EAF (ANSR/NSR)': 17.57,
-        'Level': 7.86
-    }
-    
-    # Define number formats
-    money_format = '_-"$"* #,##0.00_-;\\-"$"* #,##0.00_-;_-"$"* "-"??_-;_-@_-'
-    
-    # Get headers
-    headers = [cell.value for cell in ws[1]]
-    
-    # Format header row
-    thin_border = Border(bottom=Side(style='thin'))
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_idx)
-        cell.font = Font(bold=True, size=11, name='Calibri')
-        cell.alignment = Alignment(horizontal='center', vertical='top')
-        cell.border = thin_border
-        
-        # Set column width
-        col_letter = get_column_letter(col_idx)
-        if header in column_widths:
-            ws.column_dimensions[col_letter].width = column_widths[header]
-    
-    # Format data rows
-    last_row = ws.max_row
-    for row_idx in range(2, last_row + 1):
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            # Apply number formatting
-            if header in ['NSR', 'ANSR', 'Margin Cost', 'Expense Amount', 'TER', 'Margin Amount']:
-                cell.number_format = money_format
-
-
-def format_monthly_summary_sheet(ws) -> None:
-    """Apply comprehensive formatting to Monthly Summary sheet."""
-    from openpyxl.styles import Font, Alignment, Border, Side
-    
-    # Define number formats
-    money_format = '_-"$"* #,##0.00_-;\\-"$"* #,##0.00_-;_-"$"* "-"??_-;_-@_-'
-    
-    # Get headers
-    headers = [cell.value for cell in ws[1]]
-    
-    # Format header row
-    thin_border = Border(bottom=Side(style='thin'))
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_idx)
-        cell.font = Font(bold=True, size=11, name='Calibri')
-        cell.alignment = Alignment(horizontal='center', vertical='top')
-        cell.border = thin_border
-        
-        # Set column width
-        col_letter = get_column_letter(col_idx)
-        if header == 'Month':
-            ws.column_dimensions[col_letter].width = 12.0
-        else:
-            ws.column_dimensions[col_letter].width = 16.86
-    
-    # Format data rows
-    last_row = ws.max_row
-    for row_idx in range(2, last_row + 1):
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            # Apply number formatting
-            if header in ['ANSR / Tech Revenue', 'Margin Cost', 'Margin Amount', 'Expense Amount', 'TER']:
-                cell.number_format = money_format
-
-
-def format_recon_sheet(ws) -> None:
-    """Apply comprehensive formatting to WIP vs BoB Recon sheet."""
-    from openpyxl.styles import Font, Alignment, Border, Side
-    
-    # Get headers
-    headers = [cell.value for cell in ws[1]]
-    
-    # Format header row
-    thin_border = Border(bottom=Side(style='thin'))
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_idx)
-        cell.font = Font(bold=True, size=11, name='Calibri')
-        cell.alignment = Alignment(horizontal='center', vertical='top')
-        cell.border = thin_border
-        
-        # Set column width based on content
-        col_letter = get_column_letter(col_idx)
-        if header == 'Engagement ID':
-            ws.column_dimensions[col_letter].width = 16.43
-        elif header == 'Engagement Name':
-            ws.column_dimensions[col_letter].width = 48.14
-        elif header in ['In WIP', 'In BoB']:
-            ws.column_dimensions[col_letter].width = 10.0
-        elif header == 'Status':
-            ws.column_dimensions[col_letter].width = 20.0
-        else:
-            ws.column_dimensions[col_letter].width = 15.0
-
-
-def format_kpi_sheet(ws) -> None:
-    """Apply comprehensive formatting to KPI sheets."""
-    from openpyxl.styles import Font, Alignment, Border, Side
-    
-    # Define number formats
-    money_format = '_-"$"* #,##0.00_-;\\-"$"* #,##0.00_-;_-"$"* "-"??_-;_-@_-'
-    
-    # Get headers
-    headers = [cell.value for cell in ws[1]]
-    
-    # Format header row
-    thin_border = Border(bottom=Side(style='thin'))
-    for col_idx, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col_idx)
-        cell.font = Font(bold=True, size=11, name='Calibri')
-        cell.alignment = Alignment(horizontal='center', vertical='top', wrap_text=True)
-        cell.border = thin_border
-        
-        # Set column width
-        col_letter = get_column_letter(col_idx)
-        ws.column_dimensions[col_letter].width = 20.0
-    
-    # Format data row
-    if ws.max_row >= 2:
-        for col_idx, header in enumerate(headers, 1):
-            cell = ws.cell(row=2, column=col_idx)
-            # Apply money formatting to relevant columns
-            if any(term in str(header) for term in ['Amount', 'Revenue', 'Cost', 'BILLINGS', 'ANSR', 'TER', 'Expense', 'Margin']):
-                cell.number_format = money_format
-
-
-def employee_level(rank: str, grade: str) -> float:
-    r = (rank or '').strip().lower()
-    g = (grade or '').strip()
-    if r in ['partner/principal', 'partner']:
-        return 7
-    if r == 'executive director':
-        return 6
-    if r == 'senior manager' and g == '2':
-        return 5
-    if r == 'senior manager' and g == '1':
-        return 4
-    if r == 'manager':
-        return 3
-    if r == 'senior':
-        return 2
-    if r in ['staff', 'assistant', 'staff/assistant']:
-        return 1
-    return np.nan
+    round_float_columns(grp)
+    return grp.sort_values(by='TER', ascending=False)
+
+
+MONEY_FORMAT = '_-"$"* #,##0.00_-;\\-"$"* #,##0.00_-;_-"$"* "-"??_-;_-@_-'
+HEADER_FORMAT = {'bold': True, 'font_name': 'Calibri', 'font_size': 11, 'align': 'center', 'valign': 'top', 'bottom': 1}
+
+# xlsxwriter Format objects belong to a workbook, so only their properties are module-level
+CELL_FORMATS = {
+    'header': HEADER_FORMAT,
+    'header_wrap': dict(HEADER_FORMAT, text_wrap=True),
+    'money': {'num_format': MONEY_FORMAT},
+    'red_fill': {'bg_color': '#FFC7CE'},
+    'green_fill': {'bg_color': '#C6EFCE'},
+}
+
+# Per-sheet layout: column widths (by header, with an optional default), money columns
+# (by header, or by substring for the KPI sheets), TOTAL row columns and NUI ETD highlighting.
+SHEET_FORMATS = {
+    'engagement': {
+        'column_widths': {
+            'Engagement ID': 16.43,
+            'Engagement Name': 48.14,
+            'ANSR / Tech Revenue': 23.57,
+            'Margin Cost': 16.86,
+            'Margin Amount': 18.43,
+            'TER': 16.86,
+            'Margin %': 11.43,
+            'Hours': 13.0,
+            'Engagement Partner': 21.14,
+            'Engagement Manager': 22.43,
+            'Engagement Status': 20.0,
+            'NUI ETD': 14.29
+        },
+        'money_cols': ['ANSR / Tech Revenue', 'Margin Cost', 'Margin Amount', 'TER', 'NUI ETD'],
+        'total_cols': ['ANSR / Tech Revenue', 'Margin Cost', 'Margin Amount', 'TER', 'Hours', 'NUI ETD'],
+        'highlight_nui_etd': True,
+    },
+    'employee': {
+        'column_widths': {
+            'Employee / Product Name': 37.29,
+            'Employee GUI / Product ID': 26.71,
+            'Rank / Method': 17.43,
+            'Grade': 8.57,
+            'Employee Region': 18.57,
+            'Country / Region': 18.0,
+            'Service Line': 13.71,
+            'Hours': 9.14,
+            'NSR': 16.86,
+            'ANSR': 13.0,
+            'Margin Cost': 13.0,
+            'Expense Amount': 19.57,
+            '#Engagements': 16.0,
+            '#Opportunities': 16.57,
+            'TER': 16.86,
+            'Margin Amount': 18.43,
+            'Margin % (on ANSR)': 20.86,
+            'EAF (ANSR/NSR)': 17.57,
+            'Level': 7.86
+        },
+        'money_cols': ['NSR', 'ANSR', 'Margin Cost', 'Expense Amount', 'TER', 'Margin Amount'],
+        'total_cols': ['Hours', 'NSR', 'ANSR', 'Margin Cost', 'Expense Amount', '#Engagements', '#Opportunities',
+                       'TER', 'Margin Amount'],
+    },
+    'monthly': {
+        'column_widths': {'Month': 12.0},
+        'default_width': 16.86,
+        'money_cols': ['ANSR / Tech Revenue', 'Margin Cost', 'Margin Amount', 'Expense Amount', 'TER'],
+        'total_cols': ['Hours', 'ANSR / Tech Revenue', 'Margin Cost', 'Expense Amount', 'Margin Amount', 'TER'],
+    },
+    'recon': {
+        'column_widths': {'Engagement ID': 16.43, 'Engagement Name': 48.14, 'In WIP': 10.0, 'In BoB': 10.0, 'Status': 20.0},
+        'default_width': 15.0,
+    },
+    'kpi': {
+        'default_width': 20.0,
+        'money_terms': ['Amount', 'Revenue', 'Cost', 'BILLINGS', 'ANSR', 'TER', 'Expense', 'Margin'],
+        'wrap_header': True,
+    },
+}
+
+
+def add_workbook_formats(wb) -> dict:
+    """Declare the handful of cell formats used by every sheet once per workbook."""
+    return {name: wb.add_format(props) for name, props in CELL_FORMATS.items()}
+
+
+def write_frame(ws, df: pd.DataFrame, header_format) -> None:
+    """Stream a DataFrame into a constant_memory worksheet: header row, then one row per record."""
+    ws.write_row(0, 0, list(df.columns), header_format)
+    values = df.astype(object).where(df.notna(), None)
+    for row_idx, record in enumerate(values.itertuples(index=False, name=None), 1):
+        ws.write_row(row_idx, 0, record)
+
+
+def append_totals_row(ws, hdr_idx: dict, last_row: int, numeric_cols) -> None:
+    """Write a TOTAL row with SUBTOTAL formulas below data rows 1..last_row (hdr_idx maps header -> 0-based column)."""
+    ws.write(last_row + 1, 0, 'TOTAL')
+    for col_name in numeric_cols:
+        col_idx = hdr_idx.get(col_name)
+        if col_idx is not None:
+            ws.write_formula(last_row + 1, col_idx, f'=SUBTOTAL(9,{xl_range(1, col_idx, last_row, col_idx)})')
+
+
+def add_nui_etd_highlight(ws, hdr_idx: dict, last_row: int, formats: dict) -> None:
+    """Highlight positive NUI ETD in red and negative in green."""
+    col_idx = hdr_idx.get('NUI ETD')
+    if col_idx is not None:
+        data_range = xl_range(1, col_idx, last_row, col_idx)
+        ws.conditional_format(data_range, {'type': 'cell', 'criteria': '>', 'value': 0, 'format': formats['red_fill']})
+        ws.conditional_format(data_range, {'type': 'cell', 'criteria': '<', 'value': 0, 'format': formats['green_fill']})
+
+
+def apply_sheet_format(ws, headers, money_format, column_widths=None, default_width: Optional[float] = None,
+                       money_cols=()) -> None:
+    """Set column widths and the money number format per column rather than per cell."""
+    column_widths = column_widths or {}
+    money_cols = set(money_cols)
+    for col_idx, header in enumerate(headers):
+        width = column_widths.get(header, default_width)
+        cell_format = money_format if header in money_cols else None
+        if width is not None or cell_format is not None:
+            ws.set_column(col_idx, col_idx, width, cell_format)
+
+
+def write_sheet(wb, formats: dict, sheet_name: str, df: pd.DataFrame, sheet_format: dict) -> None:
+    """Create a sheet and write df into it using a SHEET_FORMATS entry."""
+    ws = wb.add_worksheet(sheet_name)
+    headers = list(df.columns)
+
+    money_cols = sheet_format.get('money_cols', [])
+    if 'money_terms' in sheet_format:
+        money_cols = [h for h in headers if any(term in str(h) for term in sheet_format['money_terms'])]
+    apply_sheet_format(ws, headers, formats['money'], sheet_format.get('column_widths'),
+                       sheet_format.get('default_width'), money_cols)
+    write_frame(ws, df, formats['header_wrap'] if sheet_format.get('wrap_header') else formats['header'])
+
+    last_row = len(df)
+    hdr_idx = {h: i for i, h in enumerate(headers)}
+    if 'total_cols' in sheet_format:
+        append_totals_row(ws, hdr_idx, last_row, sheet_format['total_cols'])
+    if sheet_format.get('highlight_nui_etd'):
+        add_nui_etd_highlight(ws, hdr_idx, last_row, formats)
+
+
+RANK_LEVELS = {
+    'partner/principal': 7,
+    'partner': 7,
+    'executive director': 6,
+    'manager': 3,
+    'senior': 2,
+    'staff': 1,
+    'assistant': 1,
+    'staff/assistant': 1,
+}
+SENIOR_MANAGER_GRADE_LEVELS = {'2': 5, '1': 4}
+
+
+def employee_level(rank: pd.Series, grade: pd.Series) -> pd.Series:
+    """Vectorized Rank/Grade -> Level mapping (NaN where the rank is not recognised)."""
+    r = rank.fillna('').astype(str).str.strip().str.lower()
+    g = grade.fillna('').astype(str).str.strip()
+    level = r.map(RANK_LEVELS).astype(float)
+    return level.mask(r == 'senior manager', g.map(SENIOR_MANAGER_GRADE_LEVELS).astype(float))
 
 
 def load_engagement_partners(bills_file: Optional[str]) -> Optional[pd.DataFrame]:
@@ -446,10 +416,11 @@ def load_engagement_partners(bills_file: Optional[str]) -> Optional[pd.DataFrame
                     # If Billing sheet, dedupe to a single partner per Engagement ID
                     cols_to_keep = ['Engagement ID', 'Engagement Partner']
                     if 'Billing Amount' in partners.columns:
-                        # Prefer the partner with highest billing amount
-                        partners_sorted = partners.sort_values(by='Billing Amount', ascending=False)
-                        partners_dedup = partners_sorted.dropna(subset=['Engagement Partner']).drop_duplicates(subset=['Engagement ID'])
-                        return partners_dedup[cols_to_keep]
+                        # Prefer the partner with highest billing amount (one hash groupby, no full sort)
+                        billed = partners.dropna(subset=['Engagement ID', 'Engagement Partner'])
+                        amount = pd.to_numeric(billed['Billing Amount'], errors='coerce').fillna(-np.inf)
+                        top_idx = amount.groupby(billed['Engagement ID'], sort=False).idxmax()
+                        return billed.loc[top_idx, cols_to_keep]
                     # Otherwise, just drop duplicates and keep first non-null partner
                     partners_dedup = partners.dropna(subset=['Engagement Partner']).drop_duplicates(subset=['Engagement ID'])
                     return partners_dedup[cols_to_keep]
@@ -472,7 +443,8 @@ def load_nui_etd(bob_file: Optional[str]) -> Optional[pd.DataFrame]:
                 if c in nui.columns:
                     cols.append(c)
             if len(cols) > 1:
-                df = nui[cols].copy()
+                # One row per engagement so the summary merge cannot fan out
+                df = nui[cols].drop_duplicates(subset=['Engagement ID'])
                 # Standardize partner column name to a BoB-specific field to avoid merge collisions
                 if 'Engagement Partner' in df.columns:
                     df.rename(columns={'Engagement Partner': 'Engagement Partner (BoB)'}, inplace=True)
@@ -487,65 +459,40 @@ def load_nui_etd(bob_file: Optional[str]) -> Optional[pd.DataFrame]:
 
 def wip_bob_reconciliation(df_wip: pd.DataFrame, bob_data: Optional[pd.DataFrame]) -> pd.DataFrame:
     """Create reconciliation of Engagement IDs between WIP and BoB."""
-    # Get unique engagement IDs and names from WIP
-    wip_engagements = df_wip[['Engagement ID', 'Engagement Name']].drop_duplicates()
-    wip_ids = set(wip_engagements['Engagement ID'].dropna().unique())
-    
+    # Get unique engagement IDs (first name per ID) from WIP
+    wip_engagements = df_wip[['Engagement ID', 'Engagement Name']].dropna(subset=['Engagement ID'])
+    wip_engagements = wip_engagements.drop_duplicates(subset=['Engagement ID'])
+
     # Get unique engagement IDs from BoB
-    bob_ids = set()
     if bob_data is not None and 'Engagement ID' in bob_data.columns:
-        bob_ids = set(bob_data['Engagement ID'].dropna().unique())
-    
-    # Find differences
-    only_in_wip = wip_ids - bob_ids
-    only_in_bob = bob_ids - wip_ids
-    in_both = wip_ids & bob_ids
-    
-    # Build reconciliation dataframe
-    recon_data = []
-    
-    # Engagements in both
-    for eng_id in sorted(in_both):
-        eng_name = wip_engagements[wip_engagements['Engagement ID'] == eng_id]['Engagement Name'].iloc[0] if not wip_engagements[wip_engagements['Engagement ID'] == eng_id].empty else ''
-        recon_data.append({
-            'Engagement ID': eng_id,
-            'Engagement Name': eng_name,
-            'In WIP': 'Yes',
-            'In BoB': 'Yes',
-            'Status': 'Matched'
-        })
-    
-    # Engagements only in WIP
-    for eng_id in sorted(only_in_wip):
-        eng_name = wip_engagements[wip_engagements['Engagement ID'] == eng_id]['Engagement Name'].iloc[0] if not wip_engagements[wip_engagements['Engagement ID'] == eng_id].empty else ''
-        recon_data.append({
-            'Engagement ID': eng_id,
-            'Engagement Name': eng_name,
-            'In WIP': 'Yes',
-            'In BoB': 'No',
-            'Status': 'Missing in BoB'
-        })
-    
-    # Engagements only in BoB
-    for eng_id in sorted(only_in_bob):
-        recon_data.append({
-            'Engagement ID': eng_id,
-            'Engagement Name': '',
-            'In WIP': 'No',
-            'In BoB': 'Yes',
-            'Status': 'Missing in WIP'
-        })
-    
-    recon_df = pd.DataFrame(recon_data)
+        bob_engagements = bob_data[['Engagement ID']].dropna().drop_duplicates()
+    else:
+        bob_engagements = wip_engagements[['Engagement ID']].iloc[0:0]
+
+    # Single outer join classifies every ID as matched / only in WIP / only in BoB
+    recon_df = wip_engagements.merge(bob_engagements, on='Engagement ID', how='outer', indicator=True)
+    in_wip = (recon_df['_merge'] != 'right_only').to_numpy()
+    in_bob = (recon_df['_merge'] != 'left_only').to_numpy()
+    recon_df.loc[~in_wip, 'Engagement Name'] = ''
+    recon_df['In WIP'] = np.where(in_wip, 'Yes', 'No')
+    recon_df['In BoB'] = np.where(in_bob, 'Yes', 'No')
+    recon_df['Status'] = np.select([in_wip & in_bob, in_wip], ['Matched', 'Missing in BoB'], 'Missing in WIP')
+    recon_df['_order'] = np.select([in_wip & in_bob, in_wip], [0, 1], 2)
+    recon_df = recon_df.sort_values(by=['_order', 'Engagement ID'])
+    recon_df = recon_df[['Engagement ID', 'Engagement Name', 'In WIP', 'In BoB', 'Status']]
+
+    n_wip = int(in_wip.sum())
+    n_bob = int(in_bob.sum())
+    n_both = int((in_wip & in_bob).sum())
     
     # Add summary at the top
     summary_data = [
         {'Engagement ID': 'SUMMARY', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
-        {'Engagement ID': f'Total in WIP: {len(wip_ids)}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
-        {'Engagement ID': f'Total in BoB: {len(bob_ids)}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
-        {'Engagement ID': f'Matched: {len(in_both)}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
-        {'Engagement ID': f'Only in WIP: {len(only_in_wip)}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
-        {'Engagement ID': f'Only in BoB: {len(only_in_bob)}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
+        {'Engagement ID': f'Total in WIP: {n_wip}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
+        {'Engagement ID': f'Total in BoB: {n_bob}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
+        {'Engagement ID': f'Matched: {n_both}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
+        {'Engagement ID': f'Only in WIP: {n_wip - n_both}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
+        {'Engagement ID': f'Only in BoB: {n_bob - n_both}', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
         {'Engagement ID': '', 'Engagement Name': '', 'In WIP': '', 'In BoB': '', 'Status': ''},
     ]
     
@@ -563,8 +510,8 @@ def employee_summary(df: pd.DataFrame) -> pd.DataFrame:
         'ANSR / Tech Revenue': 'sum',
         'Margin Cost': 'sum',
         'Expense Amount': 'sum',
-        'Opportunity ID': pd.Series.nunique,
-        'Engagement ID': pd.Series.nunique
+        'Opportunity ID': 'nunique',
+        'Engagement ID': 'nunique'
     }).reset_index()
 
     grp.rename(columns={
@@ -575,17 +522,20 @@ def employee_summary(df: pd.DataFrame) -> pd.DataFrame:
         'Engagement ID': '#Engagements'
     }, inplace=True)
 
-    grp['TER'] = grp['ANSR'] + grp['Expense Amount']
-    grp['Margin Amount'] = grp['ANSR'] - grp['Margin Cost']
-    grp['Margin % (on ANSR)'] = np.where(grp['ANSR'] != 0, (grp['Margin Amount'] / grp['ANSR']) * 100, np.nan)
-    grp['EAF (ANSR/NSR)'] = np.where(grp['NSR'] != 0, grp['ANSR'] / grp['NSR'], np.nan)
-    grp['Level'] = [employee_level(r, g) for r, g in zip(grp['Rank / Method'], grp['Grade'])]
+    ansr = grp['ANSR'].to_numpy(dtype=float)
+    nsr = grp['NSR'].to_numpy(dtype=float)
+    margin = ansr - grp['Margin Cost'].to_numpy(dtype=float)
+    grp['TER'] = ansr + grp['Expense Amount'].to_numpy(dtype=float)
+    grp['Margin Amount'] = margin
+    grp['Margin % (on ANSR)'] = pct_of(margin, ansr)
+    grp['EAF (ANSR/NSR)'] = np.divide(ansr, nsr, out=np.full_like(ansr, np.nan), where=nsr != 0)
+    grp['Level'] = employee_level(grp['Rank / Method'], grp['Grade'])
 
     grp = grp[['Employee / Product Name', 'Employee GUI / Product ID', 'Rank / Method', 'Grade', 'Employee Region',
                'Country / Region', 'Service Line', 'Hours', 'NSR', 'ANSR', 'Margin Cost', 'Expense Amount',
                '#Engagements', '#Opportunities', 'TER', 'Margin Amount', 'Margin % (on ANSR)', 'EAF (ANSR/NSR)', 'Level']]
-    grp = grp.round(2).sort_values(by=['Level', 'TER'], ascending=[False, False])
-    return grp
+    round_float_columns(grp)
+    return grp.sort_values(by=['Level', 'TER'], ascending=[False, False])
 
 
 def kpi_totals(df: pd.DataFrame) -> dict:
@@ -641,8 +591,8 @@ def build_markdown_table(df: pd.DataFrame) -> str:
         header = '|' + '|'.join(cols) + '|\n'
         sep = '|' + '|'.join(['---'] * len(cols)) + '|\n'
         rows = []
-        for _, r in df.head(10).iterrows():
-            rows.append('|' + '|'.join(str(r[c]) for c in cols) + '|\n')
+        for r in df.head(10).itertuples(index=False, name=None):
+            rows.append('|' + '|'.join(map(str, r)) + '|\n')
         return header + sep + ''.join(rows)
 
 
@@ -665,18 +615,22 @@ def run(input_file: str,
         if c not in df_raw.columns:
             df_raw[c] = 0
 
-    df_all = coerce_numeric(df_raw.copy(), numeric_cols)
-    df_fy = filter_fiscal_year(df_all.copy(), pd.Timestamp(fy_start), pd.Timestamp(fy_end))
+    # Numeric coercion and date parsing happen in place, so df_all and df_fy share the parsed columns
+    df_all = add_engagement_codes(coerce_numeric(df_raw, numeric_cols))
+    df_fy = filter_fiscal_year(df_all, pd.Timestamp(fy_start), pd.Timestamp(fy_end))
 
     # Monthly summary (FY window)
     date_col = 'Accounting Date' if 'Accounting Date' in df_fy.columns and df_fy['Accounting Date'].notna().any() else 'Transaction Date'
-    df_fy['Month'] = df_fy[date_col].dt.to_period('M').astype(str)
-    monthly = df_fy.groupby('Month').agg({
+    # Group on an integer year*12+month key; format 'YYYY-MM' labels only for the handful of result rows
+    dates = df_fy[date_col]
+    month_key = (dates.dt.year * 12 + dates.dt.month - 1).rename('Month')
+    monthly = df_fy.groupby(month_key).agg({
         'Charged Hours / Quantity': 'sum',
         'ANSR / Tech Revenue': 'sum',
         'Margin Cost': 'sum',
         'Expense Amount': 'sum'
     }).reset_index()
+    monthly['Month'] = [f'{k // 12:04d}-{k % 12 + 1:02d}' for k in monthly['Month'].astype(int)]
     monthly.rename(columns={'Charged Hours / Quantity': 'Hours'}, inplace=True)
     monthly['Margin Amount'] = monthly['ANSR / Tech Revenue'] - monthly['Margin Cost']
     monthly['TER'] = monthly['ANSR / Tech Revenue'] + monthly['Expense Amount']
@@ -687,9 +641,12 @@ def run(input_file: str,
     partners = load_engagement_partners(bills_file)
     nui_etd = load_nui_etd(bob_file)
 
-    eng_fy = engagement_summary(df_fy, partners, nui_etd)
-    eng_etd = engagement_summary(df_all, partners, nui_etd)
-    emp = employee_summary(df_fy)
+    # The three summaries only read their inputs; pandas' groupby kernels release the GIL, so threads overlap
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        f_eng_fy = pool.submit(engagement_summary, df_fy, partners, nui_etd)
+        f_eng_etd = pool.submit(engagement_summary, df_all, partners, nui_etd)
+        f_emp = pool.submit(employee_summary, df_fy)
+        eng_fy, eng_etd, emp = f_eng_fy.result(), f_eng_etd.result(), f_emp.result()
     totals = kpi_totals(df_fy)
 
     # Create WIP vs BoB reconciliation
@@ -704,69 +661,19 @@ def run(input_file: str,
                             billings=billings,
                             target_margin_pct=float(target_margin_pct))
 
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        eng_fy.to_excel(writer, sheet_name='Engagement Summary (FYTD)', index=False)
-        eng_etd.to_excel(writer, sheet_name='Engagement Summary (ETD)', index=False)
-        emp.to_excel(writer, sheet_name='Employee Summary', index=False)
-        monthly.to_excel(writer, sheet_name='Monthly Summary', index=False)
-        recon.to_excel(writer, sheet_name='WIP vs BoB Recon', index=False)
-        pd.DataFrame([totals]).to_excel(writer, sheet_name='KPI Totals', index=False)
-        if bridge is not None:
-            pd.DataFrame([bridge]).to_excel(writer, sheet_name='KPI Bridge', index=False)
-
-    # Add total rows with SUBTOTAL formulas and apply comprehensive formatting
-    wb = load_workbook(output_file)
-
-    # Engagement Summary totals + conditional formatting (both FYTD and ETD)
-    for sheet_name in ['Engagement Summary (FYTD)', 'Engagement Summary (ETD)']:
-        if sheet_name in wb.sheetnames:
-            add_totals_and_format(wb[sheet_name])
-            format_engagement_summary_sheet(wb[sheet_name])
-
-    # Employee Summary totals and formatting
-    if 'Employee Summary' in wb.sheetnames:
-        ws_emp = wb['Employee Summary']
-        last_row_emp = ws_emp.max_row
-        headers_emp = [cell.value for cell in ws_emp[1]]
-        ws_emp.cell(row=last_row_emp + 1, column=1).value = 'TOTAL'
-        emp_numeric_cols = ['Hours', 'NSR', 'ANSR', 'Margin Cost', 'Expense Amount', '#Engagements', '#Opportunities', 'TER', 'Margin Amount']
-        for col_name in emp_numeric_cols:
-            if col_name in headers_emp:
-                col_idx = headers_emp.index(col_name) + 1
-                col_letter = get_column_letter(col_idx)
-                start_cell = f'{col_letter}2'
-                end_cell = f'{col_letter}{last_row_emp}'
-                formula = f'=SUBTOTAL(9,{start_cell}:{end_cell})'
-                ws_emp.cell(row=last_row_emp + 1, column=col_idx).value = formula
-        format_employee_summary_sheet(ws_emp)
-
-    # Monthly Summary totals and formatting
-    if 'Monthly Summary' in wb.sheetnames:
-        ws_monthly = wb['Monthly Summary']
-        last_row_monthly = ws_monthly.max_row
-        headers_monthly = [cell.value for cell in ws_monthly[1]]
-        ws_monthly.cell(row=last_row_monthly + 1, column=1).value = 'TOTAL'
-        monthly_numeric_cols = ['Hours', 'ANSR / Tech Revenue', 'Margin Cost', 'Expense Amount', 'Margin Amount', 'TER']
-        for col_name in monthly_numeric_cols:
-            if col_name in headers_monthly:
-                col_idx = headers_monthly.index(col_name) + 1
-                col_letter = get_column_letter(col_idx)
-                start_cell = f'{col_letter}2'
-                end_cell = f'{col_letter}{last_row_monthly}'
-                formula = f'=SUBTOTAL(9,{start_cell}:{end_cell})'
-                ws_monthly.cell(row=last_row_monthly + 1, column=col_idx).value = formula
-        format_monthly_summary_sheet(ws_monthly)
-    
-    if 'WIP vs BoB Recon' in wb.sheetnames:
-        format_recon_sheet(wb['WIP vs BoB Recon'])
-    
-    if 'KPI Totals' in wb.sheetnames:
-        format_kpi_sheet(wb['KPI Totals'])
-    
-    if 'KPI Bridge' in wb.sheetnames:
-        format_kpi_sheet(wb['KPI Bridge'])
-
-    wb.save(output_file)
+    # xlsxwriter in constant_memory mode flushes each row as soon as the next one starts, so sheets
+    # are written strictly top to bottom with column formats declared up front
+    wb = xlsxwriter.Workbook(output_file, {'constant_memory': True})
+    formats = add_workbook_formats(wb)
+    write_sheet(wb, formats, 'Engagement Summary (FYTD)', eng_fy, SHEET_FORMATS['engagement'])
+    write_sheet(wb, formats, 'Engagement Summary (ETD)', eng_etd, SHEET_FORMATS['engagement'])
+    write_sheet(wb, formats, 'Employee Summary', emp, SHEET_FORMATS['employee'])
+    write_sheet(wb, formats, 'Monthly Summary', monthly, SHEET_FORMATS['monthly'])
+    write_sheet(wb, formats, 'WIP vs BoB Recon', recon, SHEET_FORMATS['recon'])
+    write_sheet(wb, formats, 'KPI Totals', pd.DataFrame([totals]), SHEET_FORMATS['kpi'])
+    if bridge is not None:
+        write_sheet(wb, formats, 'KPI Bridge', pd.DataFrame([bridge]), SHEET_FORMATS['kpi'])
+    wb.close()
 
     print('\n=== KPI TOTALS ===')
     print(pd.DataFrame([totals]).to_string(index=False))
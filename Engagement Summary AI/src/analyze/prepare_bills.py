@@ -15,28 +15,42 @@ Usage:
 """
 
 import argparse
-import re
 import sys
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
 
+from prepared_workbook import ENGAGEMENT_ID_PATTERN, read_export_frame, write_prepared_workbook
 
-def extract_engagement_id(name_str: str) -> str:
-    """Extract Engagement ID from 'Lead Engagement Name (ID) Currency' format.
+# Month key of NaT dates; sorts below every real month so it never passes a "from" filter
+NAT_MONTH_KEY = np.iinfo(np.int64).min
+
+
+def extract_engagement_ids(names: pd.Series) -> pd.Series:
+    """Extract Engagement IDs from a 'Lead Engagement Name (ID) Currency' column (NaN/no match -> <NA>).
     
     Example: "Project ABC (E-12345678) USD" -> "E-12345678"
     """
-    if pd.isna(name_str):
-        return None
-    
-    # Look for pattern (E-XXXXXXXX) or similar
-    match = re.search(r'\(([A-Z]-\d+)\)', str(name_str))
-    if match:
-        return match.group(1)
-    return None
+    return names.astype('string').str.extract(ENGAGEMENT_ID_PATTERN, expand=False)
+
+
+def month_keys(dates: pd.Series) -> np.ndarray:
+    """Months since 1970-01 as int64 (NaT -> NAT_MONTH_KEY)."""
+    return dates.to_numpy(dtype='datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+
+
+def parse_month(month: str) -> int:
+    """Convert 'YYYY-MM' to the month_keys scale."""
+    year, mon = month.split('-')
+    return (int(year) - 1970) * 12 + int(mon) - 1
+
+
+def month_labels(keys: np.ndarray) -> np.ndarray:
+    """Format month keys as 'YYYY-MM' (None for NaT), once per distinct month rather than per row."""
+    codes, uniques = pd.factorize(keys)
+    labels = [None if k == NAT_MONTH_KEY else f'{1970 + k // 12:04d}-{k % 12 + 1:02d}' for k in uniques]
+    return np.array(labels, dtype=object)[codes]
 
 
 def prepare_bills_export(input_file: str, output_file: str, invoice_month_from: str = None) -> str:
@@ -46,63 +60,68 @@ def prepare_bills_export(input_file: str, output_file: str, invoice_month_from:
     
     # Read Export sheet
     try:
-        df = pd.read_excel(input_file, sheet_name='Export', engine='openpyxl')
+        df = read_export_frame(input_file)
     except Exception as e:
         print(f"Error reading Export sheet: {e}", file=sys.stderr)
         sys.exit(1)
     
-    # Strip column names
-    df.columns = [str(c).strip() for c in df.columns]
-    
     print(f"Found {len(df)} rows in Export sheet")
     
+    # Partner names repeat on every invoice line; store each distinct name once
+    if 'Billing Partner' in df.columns:
+        df['Billing Partner'] = df['Billing Partner'].astype('category')
+    
     # 1. Add Billing Amount column
     if 'Total Invoice Amount incl Tax' not in df.columns or 'Tax' not in df.columns:
         print("Warning: 'Total Invoice Amount incl Tax' or 'Tax' column not found. Skipping Billing Amount calculation.")
     else:
-        df['Billing Amount'] = pd.to_numeric(df['Total Invoice Amount incl Tax'], errors='coerce').fillna(0) - \
-                                pd.to_numeric(df['Tax'], errors='coerce').fillna(0)
+        # One NaN-fill per input and a single subtraction on the raw arrays
+        total = pd.to_numeric(df['Total Invoice Amount incl Tax'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        tax = pd.to_numeric(df['Tax'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        df['Billing Amount'] = np.nan_to_num(total, nan=0.0) - np.nan_to_num(tax, nan=0.0)
         print("✓ Added 'Billing Amount' column")
     
     # 2. Add Invoice Month column
+    invoice_month_key = None
     if 'Invoice Date' not in df.columns:
         print("Warning: 'Invoice Date' column not found. Skipping Invoice Month calculation.")
     else:
         df['Invoice Date'] = pd.to_datetime(df['Invoice Date'], errors='coerce')
-        df['Invoice Month'] = df['Invoice Date'].dt.strftime('%Y-%m')
+        invoice_month_key = pd.Series(month_keys(df['Invoice Date']), index=df.index)
+        df['Invoice Month'] = month_labels(invoice_month_key.to_numpy())
         print("✓ Added 'Invoice Month' column")
     
     # 3. Extract Engagement ID
     if 'Lead Engagement Name (ID) Currency' not in df.columns:
         print("Warning: 'Lead Engagement Name (ID) Currency' column not found. Skipping Engagement ID extraction.")
     else:
-        df['Engagement ID'] = df['Lead Engagement Name (ID) Currency'].apply(extract_engagement_id)
+        df['Engagement ID'] = extract_engagement_ids(df['Lead Engagement Name (ID) Currency'])
         extracted_count = df['Engagement ID'].notna().sum()
         print(f"✓ Extracted Engagement ID for {extracted_count}/{len(df)} rows")
     
     # 4. Create Billing pivot table
     if 'Engagement ID' in df.columns and 'Billing Partner' in df.columns:
         # Filter rows with valid Engagement ID
-        df_valid = df[df['Engagement ID'].notna()].copy()
+        df_valid = df[df['Engagement ID'].notna()]
         
-        # Filter by Invoice Month if specified
+        # Filter by Invoice Month if specified (integer month keys when Invoice Date was parsed)
         if invoice_month_from and 'Invoice Month' in df_valid.columns:
-            df_valid = df_valid[df_valid['Invoice Month'] >= invoice_month_from].copy()
+            if invoice_month_key is not None:
+                in_range = invoice_month_key.loc[df_valid.index] >= parse_month(invoice_month_from)
+            else:
+                in_range = df_valid['Invoice Month'] >= invoice_month_from
+            df_valid = df_valid[in_range]
             print(f"✓ Filtered to invoices from {invoice_month_from} onwards: {len(df_valid)} rows")
         
         # Group by Engagement ID and Billing Partner
         pivot_cols = ['Engagement ID', 'Billing Partner']
-        agg_dict = {}
-        
-        if 'Total Invoice Amount incl Tax' in df.columns:
-            agg_dict['Total Invoice Amount incl Tax'] = 'sum'
-        if 'Tax' in df.columns:
-            agg_dict['Tax'] = 'sum'
-        if 'Billing Amount' in df.columns:
-            agg_dict['Billing Amount'] = 'sum'
+        agg_dict = {c: 'sum' for c in ('Total Invoice Amount incl Tax', 'Tax', 'Billing Amount') if c in df.columns}
         
         if agg_dict:
-            billing_pivot = df_valid.groupby(pivot_cols, as_index=False).agg(agg_dict)
+            # Category keys group on integer codes instead of hashing strings; the inferred
+            # categories are lexically ordered, so the sorted output order is unchanged
+            pivot_input = df_valid[pivot_cols + list(agg_dict)].astype({c: 'category' for c in pivot_cols})
+            billing_pivot = pivot_input.groupby(pivot_cols, as_index=False, observed=True).agg(agg_dict)
             billing_pivot = billing_pivot.round(2)
             print(f"✓ Created Billing pivot with {len(billing_pivot)} engagement-partner combinations")
             
@@ -121,35 +140,10 @@ def prepare_bills_export(input_file: str, output_file: str, invoice_month_from:
     # Write to output file
     print(f"\nWriting to {output_file}...")
     
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        # Write updated Export sheet
-        df.to_excel(writer, sheet_name='Export', index=False)
-        
-        # Write Billing pivot if available
-        if billing_pivot is not None:
-            billing_pivot.to_excel(writer, sheet_name='Billing', index=False)
-        
-        # Copy other sheets from original file
-        try:
-            original_wb = load_workbook(input_file, read_only=False)
-            for sheet_name in original_wb.sheetnames:
-                if sheet_name != 'Export':
-                    original_sheet = original_wb[sheet_name]
-                    new_sheet = writer.book.create_sheet(sheet_name)
-                    
-                    for row in original_sheet.iter_rows():
-                        for cell in row:
-                            new_cell = new_sheet[cell.coordinate]
-                            new_cell.value = cell.value
-                            if cell.has_style:
-                                new_cell.font = cell.font.copy()
-                                new_cell.border = cell.border.copy()
-                                new_cell.fill = cell.fill.copy()
-                                new_cell.number_format = cell.number_format
-                                new_cell.protection = cell.protection.copy()
-                                new_cell.alignment = cell.alignment.copy()
-        except Exception as e:
-            print(f"Warning: Could not copy other sheets: {e}")
+    frames = {'Export': df}
+    if billing_pivot is not None:
+        frames['Billing'] = billing_pivot
+    write_prepared_workbook(input_file, output_file, frames)
     
     print(f"✓ Successfully prepared {output_file}")
     
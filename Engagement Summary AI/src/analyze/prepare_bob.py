@@ -13,27 +13,20 @@ Usage:
 """
 
 import argparse
-import re
 import sys
 from pathlib import Path
 
 import pandas as pd
-from openpyxl import load_workbook
 
+from prepared_workbook import ENGAGEMENT_ID_PATTERN, read_export_frame, write_prepared_workbook
 
-def extract_engagement_id(name_str: str) -> str:
-    """Extract Engagement ID from 'Engagement Name (ID) Currency' format.
+
+def extract_engagement_ids(names: pd.Series) -> pd.Series:
+    """Extract Engagement IDs from a 'Engagement Name (ID) Currency' column (NaN/no match -> <NA>).
     
     Example: "Project XYZ (E-87654321) USD" -> "E-87654321"
     """
-    if pd.isna(name_str):
-        return None
-    
-    # Look for pattern (E-XXXXXXXX) or similar
-    match = re.search(r'\(([A-Z]-\d+)\)', str(name_str))
-    if match:
-        return match.group(1)
-    return None
+    return names.astype('string').str.extract(ENGAGEMENT_ID_PATTERN, expand=False)
 
 
 def prepare_bob_export(input_file: str, output_file: str) -> None:
@@ -43,14 +36,11 @@ def prepare_bob_export(input_file: str, output_file: str) -> None:
     
     # Read Export sheet
     try:
-        df = pd.read_excel(input_file, sheet_name='Export', engine='openpyxl')
+        df = read_export_frame(input_file)
     except Exception as e:
         print(f"Error reading Export sheet: {e}", file=sys.stderr)
         sys.exit(1)
     
-    # Strip column names
-    df.columns = [str(c).strip() for c in df.columns]
-    
     print(f"Found {len(df)} rows in Export sheet")
     
     # Extract Engagement ID
@@ -73,7 +63,7 @@ def prepare_bob_export(input_file: str, output_file: str) -> None:
     if 'Engagement ID' in df.columns:
         print("ℹ 'Engagement ID' column already exists - will overwrite with extracted values")
     
-    df['Engagement ID'] = df[source_col].apply(extract_engagement_id)
+    df['Engagement ID'] = extract_engagement_ids(df[source_col])
     extracted_count = df['Engagement ID'].notna().sum()
     print(f"✓ Extracted Engagement ID for {extracted_count}/{len(df)} rows")
     
@@ -94,31 +84,7 @@ def prepare_bob_export(input_file: str, output_file: str) -> None:
     # Write to output file
     print(f"\nWriting to {output_file}...")
     
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        # Write updated Export sheet
-        df.to_excel(writer, sheet_name='Export', index=False)
-        
-        # Copy other sheets from original file
-        try:
-            original_wb = load_workbook(input_file, read_only=False)
-            for sheet_name in original_wb.sheetnames:
-                if sheet_name != 'Export':
-                    original_sheet = original_wb[sheet_name]
-                    new_sheet = writer.book.create_sheet(sheet_name)
-                    
-                    for row in original_sheet.iter_rows():
-                        for cell in row:
-                            new_cell = new_sheet[cell.coordinate]
-                            new_cell.value = cell.value
-                            if cell.has_style:
-                                new_cell.font = cell.font.copy()
-                                new_cell.border = cell.border.copy()
-                                new_cell.fill = cell.fill.copy()
-                                new_cell.number_format = cell.number_format
-                                new_cell.protection = cell.protection.copy()
-                                new_cell.alignment = cell.alignment.copy()
-        except Exception as e:
-            print(f"Warning: Could not copy other sheets: {e}")
+    write_prepared_workbook(input_file, output_file, {'Export': df})
     
     print(f"✓ Successfully prepared {output_file}")
 
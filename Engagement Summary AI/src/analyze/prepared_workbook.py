@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Prepared Workbook Output
+------------------------
+Helpers shared by prepare_bills.py and prepare_bob.py: stream the Export sheet of an
+input workbook into a DataFrame, then write the regenerated sheets into a copy of the
+input file.
+
+Only the regenerated sheets are written with xlsxwriter. Their sheet XML and styles are
+spliced into the input's .xlsx package, and every other part (the other sheets, theme,
+defined names, drawings, ...) is copied unchanged, so those sheets keep all of their
+formatting and layout.
+"""
+
+import codecs
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+from xml.etree import ElementTree
+from xml.sax.saxutils import quoteattr
+
+import pandas as pd
+import xlsxwriter
+from openpyxl import load_workbook
+from openpyxl.xml.constants import (
+    ARC_CONTENT_TYPES, ARC_STYLE, ARC_WORKBOOK, ARC_WORKBOOK_RELS, PKG_REL_NS, REL_NS, SHEET_MAIN_NS, WORKSHEET_TYPE,
+)
+
+# Matches the bold, boxed header pandas' to_excel used to write
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+
+# Engagement ID in parentheses, e.g. "Project ABC (E-12345678) USD"
+ENGAGEMENT_ID_PATTERN = r'\(([A-Z]-\d+)\)'
+
+# Style collections copied from the generated workbook: (collection tag, child tag)
+STYLE_COLLECTIONS = [('fonts', 'font'), ('fills', 'fill'), ('borders', 'border'), ('cellXfs', 'xf')]
+
+# Cell and row style indexes in sheet XML; text content never holds '<' or '>', so a match stays inside one tag
+STYLE_INDEX_RE = re.compile(r'(<(?:c|row)\b[^>]*?\ss=")(\d+)"')
+TAB_SELECTED_RE = re.compile(r'(<sheetView\b[^>]*?)\stabSelected="(?:1|true)"')
+# Sheet indexes in workbook.xml that shift when a sheet is inserted before them
+SHEET_INDEX_RE = re.compile(r'\b(localSheetId|activeTab|firstSheet)="(\d+)"')
+
+# First id Excel leaves for custom number formats
+FIRST_CUSTOM_NUM_FMT = 164
+
+# Sheet XML is re-styled in chunks of this many bytes
+CHUNK_SIZE = 1 << 20
+
+
+def write_frame(ws, df: pd.DataFrame, header_format) -> None:
+    """Write a DataFrame row by row; constant_memory worksheets must be filled strictly in row order."""
+    ws.write_row(0, 0, list(df.columns), header_format)
+    values = df.astype(object).where(df.notna(), None)
+    for row_idx, record in enumerate(values.itertuples(index=False, name=None), 1):
+        ws.write_row(row_idx, 0, record)
+
+
+def read_export_frame(input_file: str) -> pd.DataFrame:
+    """Stream the Export sheet in read-only mode (no style parsing) into a DataFrame with stripped headers."""
+    wb = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        rows = wb['Export'].iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            raise ValueError("Export sheet is empty")
+        data = list(rows)
+    finally:
+        wb.close()
+
+    # Drop trailing blank rows (formatted but empty cells at the end of the sheet)
+    while data and all(v is None for v in data[-1]):
+        data.pop()
+    columns = [f'Unnamed: {i}' if h is None else str(h).strip() for i, h in enumerate(headers)]
+    return pd.DataFrame(data, columns=columns)
+
+
+def style_children(styles: str, tag: str, child: str) -> list:
+    """The child elements of one styles.xml collection, as XML strings."""
+    match = re.search(rf'<{tag}\b[^>]*?(/?)>', styles)
+    if match is None or match.group(1):
+        return []
+    body = styles[match.end():styles.index(f'</{tag}>', match.end())]
+    return re.findall(rf'<{child}\b[^>]*?/>|<{child}\b[^>]*?>.*?</{child}>', body, re.S)
+
+
+def extend_style_collection(styles: str, tag: str, child: str, new_children: list) -> tuple:
+    """Append elements to a styles.xml collection and update its count.
+
+    Returns (styles, index of the first appended element). A missing numFmts collection is
+    created as the first child of styleSheet, where the schema expects it.
+    """
+    match = re.search(rf'<{tag}\b[^>]*?(/?)>', styles)
+    if match is None:
+        if tag != 'numFmts':
+            raise ValueError(f"styles.xml has no <{tag}> collection")
+        root = re.search(r'<styleSheet\b[^>]*>', styles)
+        styles = f'{styles[:root.end()]}<numFmts count="0"/>{styles[root.end():]}'
+        match = re.search(rf'<{tag}\b[^>]*?(/?)>', styles)
+
+    if match.group(1):
+        body, end = '', match.end()
+    else:
+        close = styles.index(f'</{tag}>', match.end())
+        body, end = styles[match.end():close], close + len(f'</{tag}>')
+    first_index = len(re.findall(rf'<{child}\b', body))
+    open_tag = re.sub(r'\scount="\d+"', '', styles[match.start():match.end()]).rstrip('/>')
+    collection = f'{open_tag} count="{first_index + len(new_children)}">{body}{"".join(new_children)}</{tag}>'
+    return styles[:match.start()] + collection + styles[end:], first_index
+
+
+def merge_styles(styles: str, generated_styles: str) -> tuple:
+    """Append the generated workbook's number formats, fonts, fills, borders and cell formats to styles.
+
+    Returns (merged styles.xml, offset to add to the generated sheets' cell style indexes).
+    """
+    # Custom number formats get ids after the input's own
+    used_ids = [int(i) for i in re.findall(r'<numFmt\b[^>]*?\snumFmtId="(\d+)"', styles)]
+    next_id = max(used_ids + [FIRST_CUSTOM_NUM_FMT - 1]) + 1
+    num_fmt_ids = {}
+    new_num_fmts = []
+    for num_fmt in style_children(generated_styles, 'numFmts', 'numFmt'):
+        old_id = re.search(r'numFmtId="(\d+)"', num_fmt).group(1)
+        num_fmt_ids[old_id] = str(next_id)
+        new_num_fmts.append(re.sub(r'numFmtId="\d+"', f'numFmtId="{next_id}"', num_fmt))
+        next_id += 1
+    if new_num_fmts:
+        styles, _ = extend_style_collection(styles, 'numFmts', 'numFmt', new_num_fmts)
+
+    offsets = {}
+    for tag, child in STYLE_COLLECTIONS[:-1]:
+        styles, offsets[f'{child}Id'] = extend_style_collection(
+            styles, tag, child, style_children(generated_styles, tag, child)
+        )
+
+    def remap(match):
+        name, value = match.group(1), match.group(2)
+        if name == 'numFmtId':
+            value = num_fmt_ids.get(value, value)
+        else:
+            value = str(int(value) + offsets[name])
+        return f'{name}="{value}"'
+
+    xfs = [
+        re.sub(r'\b(numFmtId|fontId|fillId|borderId)="(\d+)"', remap, xf)
+        for xf in style_children(generated_styles, 'cellXfs', 'xf')
+    ]
+    return extend_style_collection(styles, 'cellXfs', 'xf', xfs)
+
+
+def copy_sheet_xml(source, target, style_offset: int) -> None:
+    """Stream a generated sheet's XML into the output, pointing its style indexes at the merged styles."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        pending += decoder.decode(chunk, final=not chunk)
+        # Cut after the last complete tag so no match spans two chunks
+        cut = pending.rfind('>') + 1 if chunk else len(pending)
+        text = STYLE_INDEX_RE.sub(lambda m: f'{m.group(1)}{int(m.group(2)) + style_offset}"', pending[:cut])
+        target.write(TAB_SELECTED_RE.sub(r'\1', text).encode('utf-8'))
+        pending = pending[cut:]
+        if not chunk:
+            break
+
+
+def part_name(target: str, base: str) -> str:
+    """Package part name of a relationship target relative to the base directory."""
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(base, target))
+
+
+def splice_sheets(input_file: str, generated_file: str, output_file: str, sheet_names: list) -> None:
+    """Copy input_file to output_file with sheet_names taken from generated_file.
+
+    A sheet that already exists in the input has its XML replaced in place (dropping the
+    tables, drawings and comments it linked to); a new one is inserted after the previous
+    generated sheet. calcChain.xml is dropped so Excel rebuilds it for the new cells.
+    """
+    with zipfile.ZipFile(input_file) as src, zipfile.ZipFile(generated_file) as gen:
+        workbook = src.read(ARC_WORKBOOK).decode('utf-8')
+        rels = src.read(ARC_WORKBOOK_RELS).decode('utf-8')
+        content_types = src.read(ARC_CONTENT_TYPES).decode('utf-8')
+        styles, style_offset = merge_styles(src.read(ARC_STYLE).decode('utf-8'), gen.read(ARC_STYLE).decode('utf-8'))
+
+        base = posixpath.dirname(ARC_WORKBOOK)
+        targets = {}
+        dropped = set()
+        for rel in ElementTree.fromstring(rels).iter(f'{{{PKG_REL_NS}}}Relationship'):
+            targets[rel.get('Id')] = part_name(rel.get('Target'), base)
+            if rel.get('Type').endswith('/calcChain'):
+                dropped.add(targets[rel.get('Id')])
+                rels = re.sub(rf'<Relationship\b[^>]*?\sId="{rel.get("Id")}"[^>]*/>', '', rels)
+                content_types = re.sub(
+                    rf'<Override\b[^>]*?\sPartName="/{re.escape(targets[rel.get("Id")])}"[^>]*/>', '', content_types
+                )
+
+        sheets = [
+            (sheet.get('name'), targets[sheet.get(f'{{{REL_NS}}}id')])
+            for sheet in ElementTree.fromstring(workbook).iter(f'{{{SHEET_MAIN_NS}}}sheet')
+        ]
+        sheet_tags = list(re.finditer(r'<sheet\b[^>]*/>', workbook))
+        if len(sheet_tags) != len(sheets):
+            raise ValueError("Unexpected sheet entries in workbook.xml")
+        rel_prefix = re.search(r'\s(\w+):id="', sheet_tags[0].group()).group(1)
+        names = [name for name, _ in sheets]
+
+        replaced = {}
+        added = []
+        insert_at = 0
+        for index, sheet_name in enumerate(sheet_names, 1):
+            generated_part = f'xl/worksheets/sheet{index}.xml'
+            if sheet_name in names:
+                position = names.index(sheet_name)
+                part = sheets[position][1]
+                replaced[part] = generated_part
+                sheet_rels = posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+                if sheet_rels in src.namelist():
+                    dropped.add(sheet_rels)
+                    for rel in ElementTree.fromstring(src.read(sheet_rels)).iter(f'{{{PKG_REL_NS}}}Relationship'):
+                        if rel.get('TargetMode') != 'External':
+                            linked = part_name(rel.get('Target'), posixpath.dirname(part))
+                            dropped.add(linked)
+                            content_types = re.sub(
+                                rf'<Override\b[^>]*?\sPartName="/{re.escape(linked)}"[^>]*/>', '', content_types
+                            )
+                insert_at = position + 1
+                continue
+
+            rel_id = next(f'rId{n}' for n in range(1, len(targets) + 2) if f'rId{n}' not in targets)
+            part = next(
+                f'xl/worksheets/sheet{n}.xml' for n in range(1, len(src.namelist()) + 2)
+                if f'xl/worksheets/sheet{n}.xml' not in src.namelist()
+                and f'xl/worksheets/sheet{n}.xml' not in targets.values()
+            )
+            targets[rel_id] = part
+            added.append((part, generated_part))
+            sheet_id = max(int(i) for i in re.findall(r'<sheet\b[^>]*?\ssheetId="(\d+)"', workbook)) + 1
+
+            # Sheet indexes at or after the insertion point move up by one
+            workbook = SHEET_INDEX_RE.sub(
+                lambda m: f'{m.group(1)}="{int(m.group(2)) + (int(m.group(2)) >= insert_at)}"', workbook
+            )
+            sheet_tags = list(re.finditer(r'<sheet\b[^>]*/>', workbook))
+            new_tag = f'<sheet name={quoteattr(sheet_name)} sheetId="{sheet_id}" {rel_prefix}:id="{rel_id}"/>'
+            at = sheet_tags[insert_at - 1].end() if insert_at else sheet_tags[0].start()
+            workbook = workbook[:at] + new_tag + workbook[at:]
+            names.insert(insert_at, sheet_name)
+            sheets.insert(insert_at, (sheet_name, part))
+            insert_at += 1
+
+            relative_target = posixpath.relpath(part, base)
+            rels = rels.replace(
+                '</Relationships>',
+                f'<Relationship Id="{rel_id}" Type="{REL_NS}/worksheet" Target="{relative_target}"/></Relationships>',
+            )
+            content_types = content_types.replace(
+                '</Types>', f'<Override PartName="/{part}" ContentType="{WORKSHEET_TYPE}"/></Types>'
+            )
+
+        rewritten = {ARC_WORKBOOK: workbook, ARC_WORKBOOK_RELS: rels, ARC_CONTENT_TYPES: content_types, ARC_STYLE: styles}
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as out:
+            for info in src.infolist():
+                if info.filename in dropped:
+                    continue
+                if info.filename in rewritten:
+                    out.writestr(info.filename, rewritten[info.filename])
+                elif info.filename in replaced:
+                    with gen.open(replaced[info.filename]) as source, out.open(info.filename, 'w') as target:
+                        copy_sheet_xml(source, target, style_offset)
+                else:
+                    with src.open(info) as source, out.open(info.filename, 'w') as target:
+                        shutil.copyfileobj(source, target, CHUNK_SIZE)
+            for part, generated_part in added:
+                with gen.open(generated_part) as source, out.open(part, 'w') as target:
+                    copy_sheet_xml(source, target, style_offset)
+
+
+def write_prepared_workbook(input_file: str, output_file: str, frames: dict) -> None:
+    """Write frames ({sheet name: DataFrame}, in order) into a copy of input_file.
+
+    The frames are written with xlsxwriter to a temporary workbook and spliced into the input
+    package; if that fails, the output holds the regenerated sheets alone.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        generated_file = os.path.join(tmp_dir, 'generated.xlsx')
+        # constant_memory flushes each row as soon as the next one starts, keeping the writer's footprint flat
+        wb = xlsxwriter.Workbook(generated_file, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+        header_format = wb.add_format(HEADER_FORMAT)
+        try:
+            for sheet_name, df in frames.items():
+                write_frame(wb.add_worksheet(sheet_name), df, header_format)
+        finally:
+            wb.close()
+
+        try:
+            splice_sheets(input_file, generated_file, output_file, list(frames))
+        except Exception as e:
+            print(f"Warning: Could not copy other sheets: {e}")
+            shutil.copyfile(generated_file, output_file)
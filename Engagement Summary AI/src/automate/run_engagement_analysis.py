@@ -73,25 +73,15 @@ class EngagementAnalysisWorkflow:
         folder = downloads['folder_path']
         library = downloads.get('library_name', 'Documents')
         
-        files = {}
-        
-        # Download WIPs file
-        if 'wips_pattern' in downloads:
-            files['wips'] = self.sp_client.download_latest_file(
-                site_name, folder, downloads['wips_pattern'], str(self.work_dir), library
-            )
-        
-        # Download Bills file
-        if 'bills_pattern' in downloads:
-            files['bills'] = self.sp_client.download_latest_file(
-                site_name, folder, downloads['bills_pattern'], str(self.work_dir), library
-            )
-        
-        # Download BoB file
-        if 'bob_pattern' in downloads:
-            files['bob'] = self.sp_client.download_latest_file(
-                site_name, folder, downloads['bob_pattern'], str(self.work_dir), library
-            )
+        # Download the WIPs, Bills and BoB files in parallel
+        patterns = {
+            key: downloads[f'{key}_pattern']
+            for key in ('wips', 'bills', 'bob')
+            if f'{key}_pattern' in downloads
+        }
+        files = self.sp_client.download_latest_files(
+            site_name, folder, patterns, str(self.work_dir), library
+        )
         
         print(f"\n✓ Downloaded {len(files)} files")
         return files
@@ -15,11 +15,21 @@ Requirements:
 import json
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 import requests
 from msal import PublicClientApplication, ConfidentialClientApplication
 
+# Graph accepts a single PUT up to 4 MB; larger files go through an upload session
+SIMPLE_UPLOAD_LIMIT = 4 * 1024 * 1024
+# Upload session chunks must be a multiple of 320 KiB
+UPLOAD_CHUNK_SIZE = 32 * 320 * 1024
+# Downloads are streamed to disk in blocks of this size
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Concurrent file downloads in download_latest_files
+MAX_PARALLEL_DOWNLOADS = 4
+
 
 class SharePointClient:
     """Client for SharePoint operations via Microsoft Graph API."""
@@ -29,6 +39,10 @@ class SharePointClient:
         self.config = self._load_config(config_file)
         self.access_token = None
         self.graph_endpoint = 'https://graph.microsoft.com/v1.0'
+        # (site_name, library_name) -> drive ID; stable for the life of the client
+        self._drive_ids: Dict[Tuple[str, str], str] = {}
+        # One session so Graph calls reuse the pooled TCP/TLS connections
+        self.session = requests.Session()
         
     def _load_config(self, config_file: str) -> dict:
         """Load SharePoint configuration from JSON file."""
@@ -95,20 +109,25 @@ class SharePointClient:
         }
     
     def _get_drive_id(self, site_name: str, library_name: str = 'Documents') -> str:
-        """Get drive ID for a SharePoint library."""
+        """Get drive ID for a SharePoint library (looked up once per site/library)."""
+        cache_key = (site_name, library_name)
+        if cache_key in self._drive_ids:
+            return self._drive_ids[cache_key]
+        
         # Get site ID
         site_url = f"{self.graph_endpoint}/sites/{self.config['sharepoint_domain']}:/sites/{site_name}"
-        response = requests.get(site_url, headers=self._get_headers())
+        response = self.session.get(site_url, headers=self._get_headers())
         response.raise_for_status()
         site_id = response.json()['id']
         
         # Get drive ID
         drives_url = f"{self.graph_endpoint}/sites/{site_id}/drives"
-        response = requests.get(drives_url, headers=self._get_headers())
+        response = self.session.get(drives_url, headers=self._get_headers())
         response.raise_for_status()
         
         for drive in response.json()['value']:
             if drive['name'] == library_name:
+                self._drive_ids[cache_key] = drive['id']
                 return drive['id']
         
         raise Exception(f"Library '{library_name}' not found in site '{site_name}'")
@@ -124,15 +143,15 @@ class SharePointClient:
         file_path = f"{folder_path}/{filename}".replace('//', '/')
         file_url = f"{self.graph_endpoint}/drives/{drive_id}/root:/{file_path}:/content"
         
-        response = requests.get(file_url, headers=self._get_headers())
-        response.raise_for_status()
-        
-        # Save to local file
+        # Save to local file, streaming the body rather than holding it in memory
         local_file = Path(local_path) / filename
         local_file.parent.mkdir(parents=True, exist_ok=True)
         
-        with open(local_file, 'wb') as f:
-            f.write(response.content)
+        with self.session.get(file_url, headers=self._get_headers(), stream=True) as response:
+            response.raise_for_status()
+            with open(local_file, 'wb') as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
         
         print(f"✓ Downloaded to {local_file}")
         return str(local_file)
@@ -144,28 +163,70 @@ class SharePointClient:
         print(f"Searching for latest {pattern} in {folder_path}...")
         
         drive_id = self._get_drive_id(site_name, library_name)
+        latest_file = self._find_latest_item(drive_id, folder_path, pattern)
         
-        # List files in folder
-        folder_url = f"{self.graph_endpoint}/drives/{drive_id}/root:/{folder_path}:/children"
-        response = requests.get(folder_url, headers=self._get_headers())
-        response.raise_for_status()
-        
-        # Filter files matching pattern and sort by modified date
-        files = [
-            item for item in response.json()['value']
-            if 'file' in item and pattern.lower() in item['name'].lower()
-        ]
-        
-        if not files:
+        if latest_file is None:
             print(f"Warning: No files matching '{pattern}' found in {folder_path}")
             return None
         
-        # Get the most recently modified file
-        latest_file = max(files, key=lambda x: x['lastModifiedDateTime'])
         filename = latest_file['name']
         
         return self.download_file(site_name, folder_path, filename, local_path, library_name)
     
+    def _find_latest_item(self, drive_id: str, folder_path: str, pattern: str) -> Optional[dict]:
+        """Return the most recently modified file in a folder whose name contains pattern.
+        
+        Graph sorts the listing newest first and returns only the fields used here, so the
+        scan stops at the first match. If the library rejects $orderby, the listing is
+        scanned in full and the newest match is picked client-side.
+        """
+        folder_url = f"{self.graph_endpoint}/drives/{drive_id}/root:/{folder_path}:/children"
+        params = {'$select': 'name,file,lastModifiedDateTime'}
+        
+        response = self.session.get(folder_url, headers=self._get_headers(),
+                                    params={**params, '$orderby': 'lastModifiedDateTime desc'})
+        ordered = response.status_code != 400
+        if not ordered:
+            response = self.session.get(folder_url, headers=self._get_headers(), params=params)
+        
+        latest = None
+        pattern = pattern.lower()
+        while True:
+            response.raise_for_status()
+            page = response.json()
+            for item in page['value']:
+                if 'file' in item and pattern in item['name'].lower():
+                    if ordered:
+                        return item
+                    if latest is None or item['lastModifiedDateTime'] > latest['lastModifiedDateTime']:
+                        latest = item
+            
+            # Large folders are paged; the next link carries the original query
+            next_link = page.get('@odata.nextLink')
+            if not next_link:
+                return latest
+            response = self.session.get(next_link, headers=self._get_headers())
+    
+    def download_latest_files(self, site_name: str, folder_path: str, patterns: Dict[str, str],
+                              local_path: str, library_name: str = 'Documents') -> Dict[str, Optional[str]]:
+        """Download the latest file for each pattern concurrently.
+        
+        Args:
+            patterns: key -> filename pattern, e.g. {'bills': 'Bills', 'bob': 'BoB'}
+        
+        Returns:
+            key -> local file path (None where nothing matched)
+        """
+        # Resolve the drive once up front so the workers all hit the cache
+        self._get_drive_id(site_name, library_name)
+        
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_DOWNLOADS) as pool:
+            futures = {
+                key: pool.submit(self.download_latest_file, site_name, folder_path, pattern, local_path, library_name)
+                for key, pattern in patterns.items()
+            }
+            return {key: future.result() for key, future in futures.items()}
+    
     def upload_file(self, site_name: str, folder_path: str, local_file: str,
                    library_name: str = 'Documents', overwrite: bool = True) -> str:
         """Upload a file to SharePoint."""
@@ -176,16 +237,18 @@ class SharePointClient:
         
         # Construct upload path
         file_path = f"{folder_path}/{filename}".replace('//', '/')
-        upload_url = f"{self.graph_endpoint}/drives/{drive_id}/root:/{file_path}:/content"
-        
-        headers = self._get_headers()
-        headers['Content-Type'] = 'application/octet-stream'
+        item_url = f"{self.graph_endpoint}/drives/{drive_id}/root:/{file_path}:"
+        file_size = Path(local_file).stat().st_size
         
+        # Stream from the open file rather than reading it into memory
         with open(local_file, 'rb') as f:
-            file_content = f.read()
-        
-        response = requests.put(upload_url, headers=headers, data=file_content)
-        response.raise_for_status()
+            if file_size < SIMPLE_UPLOAD_LIMIT:
+                headers = self._get_headers()
+                headers['Content-Type'] = 'application/octet-stream'
+                response = self.session.put(f"{item_url}/content", headers=headers, data=f)
+                response.raise_for_status()
+            else:
+                response = self._upload_in_chunks(item_url, f, file_size, overwrite)
         
         result = response.json()
         web_url = result.get('webUrl', '')
@@ -195,6 +258,29 @@ class SharePointClient:
         
         return web_url
     
+    def _upload_in_chunks(self, item_url: str, f, file_size: int, overwrite: bool) -> requests.Response:
+        """Upload an open file through a Graph upload session, one chunk in memory at a time."""
+        session_data = {
+            "item": {"@microsoft.graph.conflictBehavior": "replace" if overwrite else "fail"}
+        }
+        response = self.session.post(f"{item_url}/createUploadSession", headers=self._get_headers(), json=session_data)
+        response.raise_for_status()
+        upload_url = response.json()['uploadUrl']
+        
+        # The upload URL is pre-authenticated; sending the bearer token to it is rejected
+        offset = 0
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            end = offset + len(chunk) - 1
+            headers = {
+                'Content-Length': str(len(chunk)),
+                'Content-Range': f'bytes {offset}-{end}/{file_size}'
+            }
+            response = self.session.put(upload_url, headers=headers, data=chunk)
+            response.raise_for_status()
+            offset = end + 1
+        
+        return response
+    
     def create_share_link(self, site_name: str, folder_path: str, filename: str,
                          library_name: str = 'Documents', 
                          link_type: str = 'view') -> str:
@@ -210,7 +296,7 @@ class SharePointClient:
         
         # Get item ID
         item_url = f"{self.graph_endpoint}/drives/{drive_id}/root:/{file_path}"
-        response = requests.get(item_url, headers=self._get_headers())
+        response = self.session.get(item_url, headers=self._get_headers())
         response.raise_for_status()
         item_id = response.json()['id']
         
@@ -221,7 +307,7 @@ class SharePointClient:
             "scope": "organization"
         }
         
-        response = requests.post(share_url, headers=self._get_headers(), json=share_data)
+        response = self.session.post(share_url, headers=self._get_headers(), json=share_data)
         response.raise_for_status()
         
         share_link = response.json()['link']['webUrl']
@@ -255,7 +341,7 @@ class SharePointClient:
         }
         
         send_url = f"{self.graph_endpoint}/me/sendMail"
-        response = requests.post(send_url, headers=self._get_headers(), json=email_data)
+        response = self.session.post(send_url, headers=self._get_headers(), json=email_data)
         
         if response.status_code == 202:
             print("✓ Notification sent successfully")
@@ -5,10 +5,20 @@ Reads from School Profile 2025.xlsx and loads into gnaf.school_profile_2025 tabl
 import pandas as pd
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
+from io import StringIO
 from pathlib import Path
 import sys
 import os
 from dotenv import load_dotenv
+from setup_school_profile_2025 import create_indexes, drop_indexes
+
+
+# INT columns; pandas reads them as float when the sheet has blanks, and COPY rejects '2000.0'
+INTEGER_COLUMNS = ('calendar_year', 'acara_sml_id', 'postcode')
+
+# Rows per multi-row INSERT when COPY is not usable
+INSERT_PAGE_SIZE = 1000
 
 
 def connect_to_db(host='localhost', port=5432, database='gnaf_db', user='postgres', password=''):
@@ -28,6 +38,42 @@ def connect_to_db(host='localhost', port=5432, database='gnaf_db', user='postgre
         sys.exit(1)
 
 
+def copy_school_profile_rows(cursor, df, db_columns):
+    """Stream df[db_columns] into gnaf.school_profile_2025 with a single COPY, return rows sent"""
+    df = df[db_columns]
+    for col in INTEGER_COLUMNS:
+        if col in df.columns and df[col].dtype.kind == 'f':
+            df = df.assign(**{col: df[col].astype('Int64')})
+    
+    buffer = StringIO()
+    # na_rep='\\N' writes None/NaN as \N, which COPY reads as NULL
+    df.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    
+    copy_query = sql.SQL("COPY gnaf.school_profile_2025 ({}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')").format(
+        sql.SQL(', ').join(map(sql.Identifier, db_columns))
+    )
+    cursor.copy_expert(copy_query, buffer)
+    return len(df)
+
+
+def finish_load(conn):
+    """Rebuild indexes, restore autovacuum/synchronous_commit and refresh planner statistics"""
+    create_indexes(conn)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("ALTER TABLE gnaf.school_profile_2025 RESET (autovacuum_enabled)")
+        cursor.execute("RESET synchronous_commit")
+        cursor.execute("ANALYZE gnaf.school_profile_2025")
+        conn.commit()
+        print("✓ Analyzed gnaf.school_profile_2025")
+    except psycopg2.Error as e:
+        print(f"✗ Error analyzing table: {e}")
+        conn.rollback()
+    finally:
+        cursor.close()
+
+
 def load_school_profile_data(conn, excel_file):
     """Load School Profile 2025 data from Excel to PostgreSQL"""
     
@@ -97,11 +143,11 @@ def load_school_profile_data(conn, excel_file):
     df_renamed = df_renamed.where(pd.notna(df_renamed), None)
     
     # Convert empty strings and 'nan' strings to None for proper NULL handling
-    for col in df_renamed.columns:
-        if df_renamed[col].dtype == 'object':  # String columns only
-            df_renamed[col] = df_renamed[col].apply(
-                lambda x: None if (isinstance(x, str) and (x.strip() == '' or x.lower() == 'nan')) else x
-            )
+    # (vectorized string ops per text column rather than a Python call per cell)
+    for col in df_renamed.select_dtypes(include=['object', 'string']).columns:
+        text = df_renamed[col].astype('string')
+        blank = text.str.strip().eq('') | text.str.lower().eq('nan')
+        df_renamed[col] = df_renamed[col].mask(blank.fillna(False).to_numpy(dtype=bool), None)
     
     print(f"✓ Converted all blank values to NULL")
     
@@ -109,6 +155,12 @@ def load_school_profile_data(conn, excel_file):
     cursor = conn.cursor()
     try:
         cursor.execute("TRUNCATE TABLE gnaf.school_profile_2025")
+        # Secondary indexes are rebuilt once after the load instead of updated per row
+        drop_indexes(cursor)
+        # Keep autovacuum off the table while it fills; finish_load analyzes it once at the end
+        cursor.execute("ALTER TABLE gnaf.school_profile_2025 SET (autovacuum_enabled = false)")
+        # Reloadable data, so commits during the load need not wait for the WAL flush
+        cursor.execute("SET synchronous_commit TO off")
         conn.commit()
         print(f"✓ Truncated table gnaf.school_profile_2025")
     except psycopg2.Error as e:
@@ -125,42 +177,65 @@ def load_school_profile_data(conn, excel_file):
     # Get column names for insert statement
     db_columns = [column_mapping[col] for col in df.columns if col in column_mapping]
     
-    insert_query = sql.SQL("""
-        INSERT INTO gnaf.school_profile_2025 ({}) 
-        VALUES ({})
-    """).format(
-        sql.SQL(', ').join(map(sql.Identifier, db_columns)),
-        sql.SQL(', ').join(sql.Placeholder() * len(db_columns))
-    )
-    
-    # Batch insert for better performance
-    batch_size = 100
-    for idx, row in df_renamed.iterrows():
+    try:
+        # Use COPY for one bulk payload instead of a statement per row
         try:
-            values = [row[col] for col in db_columns]
-            cursor.execute(insert_query, values)
-            inserted_count += 1
-            
-            # Commit every batch_size records
-            if (idx + 1) % batch_size == 0:
+            inserted_count = copy_school_profile_rows(cursor, df_renamed, db_columns)
+            conn.commit()
+            print(f"✓ Loaded {inserted_count} rows using COPY command")
+            return inserted_count
+        except Exception as copy_error:
+            print(f"⚠ COPY command failed: {copy_error}")
+            print(f"⚠ Falling back to batched INSERT to isolate bad records...")
+            conn.rollback()
+        
+        columns_sql = sql.SQL(', ').join(map(sql.Identifier, db_columns))
+        batch_query = sql.SQL("INSERT INTO gnaf.school_profile_2025 ({}) VALUES %s").format(columns_sql)
+        row_query = sql.SQL("""
+            INSERT INTO gnaf.school_profile_2025 ({}) 
+            VALUES ({})
+        """).format(
+            columns_sql,
+            sql.SQL(', ').join(sql.Placeholder() * len(db_columns))
+        )
+        
+        # Plain tuples in db_columns order, built once (no per-row Series boxing)
+        records = list(df_renamed[db_columns].itertuples(index=False, name=None))
+        
+        # One multi-row INSERT per page; a page that fails is retried row by row to skip the bad records
+        for start in range(0, len(records), INSERT_PAGE_SIZE):
+            rows = records[start:start + INSERT_PAGE_SIZE]
+            try:
+                execute_values(cursor, batch_query, rows, page_size=INSERT_PAGE_SIZE)
                 conn.commit()
-                print(f"  Inserted {idx + 1}/{len(df)} records...")
+                inserted_count += len(rows)
+            except psycopg2.Error:
+                conn.rollback()
+                for offset, values in enumerate(rows):
+                    try:
+                        cursor.execute(row_query, values)
+                        conn.commit()
+                        inserted_count += 1
+                    except psycopg2.Error as e:
+                        failed_count += 1
+                        if failed_count <= 5:  # Show first 5 errors
+                            acara_id = dict(zip(db_columns, values)).get('acara_sml_id')
+                            print(f"  ✗ Error inserting row {start + offset + 1} (ACARA ID: {acara_id}): {e}")
+                        conn.rollback()
+            
+            print(f"  Inserted {inserted_count}/{len(df)} records...")
         
-        except psycopg2.Error as e:
-            failed_count += 1
-            if failed_count <= 5:  # Show first 5 errors
-                print(f"  ✗ Error inserting row {idx + 1} (ACARA ID: {row.get('acara_sml_id')}): {e}")
-            conn.rollback()
-    
-    # Final commit
-    conn.commit()
-    
-    print(f"\n✓ Successfully inserted: {inserted_count} records")
-    if failed_count > 0:
-        print(f"✗ Failed records: {failed_count}")
-    
-    cursor.close()
-    return inserted_count
+        print(f"\n✓ Successfully inserted: {inserted_count} records")
+        if failed_count > 0:
+            print(f"✗ Failed records: {failed_count}")
+        
+        return inserted_count
+    finally:
+        # Whatever happened above, rebuild the dropped indexes and re-enable autovacuum;
+        # the rollback only discards work left uncommitted by an unexpected error
+        conn.rollback()
+        cursor.close()
+        finish_load(conn)
 
 
 def main():
@@ -4,8 +4,13 @@ This script loads primary, secondary, and future school catchment data into the
 """
 
 import geopandas as gpd
+import numpy as np
+import pandas as pd
 import psycopg2
-from sqlalchemy import create_engine
+import shapely
+from io import StringIO
+from shapely.geometry import MultiLineString, MultiPoint, MultiPolygon
+from sqlalchemy import create_engine, text
 import os
 from dotenv import load_dotenv
 
@@ -21,6 +26,9 @@ DB_PASSWORD = os.getenv('DB_PASSWORD', 'admin')
 # Database connection string for SQLAlchemy
 connection_string = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
 
+# Multi-part type that single-part geometries are promoted to when a layer mixes the two
+MULTI_TYPES = {'Point': MultiPoint, 'LineString': MultiLineString, 'Polygon': MultiPolygon}
+
 def enable_postgis():
     """Enable PostGIS extension if not already enabled"""
     print("Enabling PostGIS extension...")
@@ -43,8 +51,58 @@ def enable_postgis():
     cursor.close()
     conn.close()
 
-def load_shapefile(shapefile_path, table_name, schema='public'):
-    """Load a shapefile into PostgreSQL"""
+def geometry_column_type(gdf):
+    """
+    PostGIS type of gdf's geometry column, inferred from its rows as to_postgis does
+    (from the empty frame that creates the table it can only infer a generic GEOMETRY).
+    Returns (type, gdf); a layer mixing e.g. Polygon and MultiPolygon becomes MULTIPOLYGON,
+    with its single-part geometries promoted so they fit the column.
+    """
+    geom_types = set(gdf.geom_type.dropna())
+    singles = [t for t in geom_types if f'Multi{t}' in geom_types]
+    
+    if len(geom_types) == 1:
+        geom_type = geom_types.pop()
+    elif len(geom_types) == 2 and singles:
+        single = singles[0]
+        geom_type = f'Multi{single}'
+        promote = MULTI_TYPES[single]
+        geometry = gdf.geometry
+        gdf = gdf.copy()
+        gdf[geometry.name] = geometry.apply(lambda g: promote([g]) if g is not None and g.geom_type == single else g)
+    else:
+        geom_type = 'Geometry'
+    
+    if gdf.has_z.any():
+        geom_type += 'Z'
+    return geom_type.upper(), gdf
+
+def copy_geodataframe(gdf, table_name, schema, engine):
+    """COPY the rows of gdf into an existing table, index first as to_postgis writes it"""
+    srid = gdf.crs.to_epsg() or 0
+    
+    # Geometries go over as hex EWKB (SRID included), which PostGIS parses directly
+    frame = pd.DataFrame(gdf).reset_index()
+    geometries = shapely.set_srid(np.asarray(gdf.geometry), srid)
+    frame[gdf.geometry.name] = shapely.to_wkb(geometries, hex=True, include_srid=True)
+    
+    buffer = StringIO()
+    # na_rep='\\N' writes None/NaN as \N, which COPY reads as NULL
+    frame.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    
+    columns = ', '.join(f'"{col}"' for col in frame.columns)
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.copy_expert(f"COPY {schema}.{table_name} ({columns}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')", buffer)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+def load_shapefile(shapefile_path, table_name, schema='public', engine=None):
+    """Load a shapefile into PostgreSQL (pass engine to share its connection pool across calls)"""
     print(f"\nLoading {shapefile_path}...")
     
     # Read shapefile with geopandas
@@ -61,34 +119,40 @@ def load_shapefile(shapefile_path, table_name, schema='public'):
         gdf = gdf.to_crs('EPSG:4326')
     
     # Load into PostgreSQL
-    engine = create_engine(connection_string)
+    owns_engine = engine is None
+    if owns_engine:
+        engine = create_engine(connection_string)
     print(f"  Writing to database table: {schema}.{table_name}...")
     
-    gdf.to_postgis(
-        name=table_name,
-        con=engine,
-        schema=schema,
-        if_exists='replace',
-        index=True
-    )
-    
-    print(f"✓ Loaded {len(gdf)} records to {schema}.{table_name}")
-    
-    # Create spatial index
-    print(f"  Creating spatial index...")
-    conn = psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
-    cursor = conn.cursor()
-    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_geom ON {schema}.{table_name} USING GIST (geometry);")
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print(f"✓ Spatial index created")
+    try:
+        geom_type, gdf = geometry_column_type(gdf)
+        srid = gdf.crs.to_epsg() or 0
+        
+        # Let to_postgis (re)create the empty table, then COPY the rows instead of INSERTing them
+        gdf.iloc[:0].to_postgis(
+            name=table_name,
+            con=engine,
+            schema=schema,
+            if_exists='replace',
+            index=True
+        )
+        with engine.begin() as conn:
+            # Type the column as to_postgis would have for the full frame (instant on the empty table)
+            conn.execute(text(
+                f'ALTER TABLE {schema}.{table_name} ALTER COLUMN "{gdf.geometry.name}" TYPE geometry({geom_type}, {srid});'
+            ))
+        copy_geodataframe(gdf, table_name, schema, engine)
+        
+        print(f"✓ Loaded {len(gdf)} records to {schema}.{table_name}")
+        
+        # Create spatial index
+        print(f"  Creating spatial index...")
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_geom ON {schema}.{table_name} USING GIST (geometry);"))
+        print(f"✓ Spatial index created")
+    finally:
+        if owns_engine:
+            engine.dispose()
     
     return gdf
 
@@ -117,12 +181,16 @@ def main():
         'nsw_school_catchments/catchments_future.shp': 'school_catchments_future'
     }
     
-    # Load each shapefile
-    for shapefile, table_name in shapefiles.items():
-        try:
-            load_shapefile(shapefile, table_name, schema='public')
-        except Exception as e:
-            print(f"✗ Error loading {shapefile}: {e}")
+    # Load each shapefile, reusing one engine (and its pooled connections) for all of them
+    engine = create_engine(connection_string, pool_pre_ping=True)
+    try:
+        for shapefile, table_name in shapefiles.items():
+            try:
+                load_shapefile(shapefile, table_name, schema='public', engine=engine)
+            except Exception as e:
+                print(f"✗ Error loading {shapefile}: {e}")
+    finally:
+        engine.dispose()
     
     print("\n" + "=" * 60)
     print("Loading Complete!")
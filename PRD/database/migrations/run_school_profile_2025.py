@@ -0,0 +1,70 @@
+"""
+Run the School Profile 2025 migration end to end
+1. Create the table (setup_school_profile_2025)
+2. Import data from Excel (import_school_profile_2025)
+3. Verify the imported data (verify_school_profile_2025)
+
+All three steps share one database connection and one .env load.
+
+Usage:
+    python run_school_profile_2025.py ["School Profile 2025.xlsx"]
+"""
+import psycopg2
+import os
+import sys
+from dotenv import load_dotenv
+
+from setup_school_profile_2025 import create_table
+from import_school_profile_2025 import load_school_profile_data
+from verify_school_profile_2025 import verify_school_profile
+
+
+def main():
+    """Main function"""
+    print("=" * 80)
+    print("School Profile 2025 - Setup, Import and Verify")
+    print("=" * 80)
+    
+    # Load environment variables
+    load_dotenv()
+    
+    # Database connection parameters from .env; keepalives keep the session up across steps
+    db_config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', 5432)),
+        'database': os.getenv('DB_NAME', 'gnaf_db'),
+        'user': os.getenv('DB_USER', 'postgres'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'keepalives': 1,
+        'keepalives_idle': 30,
+    }
+    
+    excel_file = sys.argv[1] if len(sys.argv) > 1 else 'School Profile 2025.xlsx'
+    
+    try:
+        conn = psycopg2.connect(**db_config)
+        print(f"✓ Connected to {db_config['database']}")
+    except psycopg2.Error as e:
+        print(f"✗ Error connecting to database: {e}")
+        sys.exit(1)
+    
+    try:
+        if not create_table(conn):
+            print("\n✗ Failed to create table")
+            sys.exit(1)
+        
+        count = load_school_profile_data(conn, excel_file)
+        if count == 0:
+            print("\n✗ No data was imported")
+            sys.exit(1)
+        
+        print()
+        verify_school_profile(conn)
+    
+    finally:
+        conn.close()
+        print("\n✓ Database connection closed")
+
+
+if __name__ == '__main__':
+    main()
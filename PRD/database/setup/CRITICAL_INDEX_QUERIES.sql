@@ -56,9 +56,18 @@ LIMIT 100;
 ALTER TABLE gnaf.address_default_geocode 
 ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326);
 
-UPDATE gnaf.address_default_geocode 
-SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
-WHERE longitude IS NOT NULL AND latitude IS NOT NULL AND geom IS NULL;
+-- Skipped when scripts/add_geometry_columns.py added geom as a GENERATED column:
+-- PostgreSQL then computes it from longitude/latitude and rejects UPDATEs of it
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = 'gnaf' AND table_name = 'address_default_geocode'
+                 AND column_name = 'geom' AND is_generated = 'NEVER') THEN
+        UPDATE gnaf.address_default_geocode 
+        SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+        WHERE longitude IS NOT NULL AND latitude IS NOT NULL AND geom IS NULL;
+    END IF;
+END $$;
 
 
 -- ============================================
@@ -71,7 +80,7 @@ WHERE longitude IS NOT NULL AND latitude IS NOT NULL AND geom IS NULL;
 --
 -- 2. Create/populate geom column (if needed):
 --    ALTER TABLE gnaf.address_default_geocode ADD COLUMN geom geometry(Point, 4326);
---    UPDATE ... (see above)
+--    UPDATE ... (see above; not needed if scripts/add_geometry_columns.py created geom)
 --
 -- 3. Create the CRITICAL spatial index:
 --    CREATE INDEX CONCURRENTLY idx_address_default_geocode_geom ...
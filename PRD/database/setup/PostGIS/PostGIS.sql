@@ -14,11 +14,20 @@ COMMENT ON COLUMN address_default_geocode.geom IS 'Point geometry in WGS84 (SRID
 ALTER TABLE IF EXISTS postcodes 
 ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326);
 
-UPDATE address_default_geocode 
-SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
-WHERE longitude IS NOT NULL 
-  AND latitude IS NOT NULL
-  AND geom IS NULL;
+-- Skipped when scripts/add_geometry_columns.py added geom as a GENERATED column:
+-- PostgreSQL then computes it from longitude/latitude and rejects UPDATEs of it
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = 'gnaf' AND table_name = 'address_default_geocode'
+                 AND column_name = 'geom' AND is_generated = 'NEVER') THEN
+        UPDATE address_default_geocode 
+        SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+        WHERE longitude IS NOT NULL 
+          AND latitude IS NOT NULL
+          AND geom IS NULL;
+    END IF;
+END $$;
 
   select * from address_default_geocode limit 1
 
@@ -69,18 +69,34 @@ ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326);
 -- ============================================
 
 -- Update ADDRESS_DEFAULT_GEOCODE geometry
-UPDATE address_default_geocode 
-SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
-WHERE longitude IS NOT NULL 
-  AND latitude IS NOT NULL
-  AND geom IS NULL;
-
--- Update ADDRESS_SITE_GEOCODE geometry
-UPDATE address_site_geocode 
-SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
-WHERE longitude IS NOT NULL 
-  AND latitude IS NOT NULL
-  AND geom IS NULL;
+-- Skipped when scripts/add_geometry_columns.py added geom as a GENERATED column:
+-- PostgreSQL then computes it from longitude/latitude and rejects UPDATEs of it
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = 'gnaf' AND table_name = 'address_default_geocode'
+                 AND column_name = 'geom' AND is_generated = 'NEVER') THEN
+        UPDATE address_default_geocode 
+        SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+        WHERE longitude IS NOT NULL 
+          AND latitude IS NOT NULL
+          AND geom IS NULL;
+    END IF;
+END $$;
+
+-- Update ADDRESS_SITE_GEOCODE geometry (skipped for a generated geom, as above)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = 'gnaf' AND table_name = 'address_site_geocode'
+                 AND column_name = 'geom' AND is_generated = 'NEVER') THEN
+        UPDATE address_site_geocode 
+        SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+        WHERE longitude IS NOT NULL 
+          AND latitude IS NOT NULL
+          AND geom IS NULL;
+    END IF;
+END $$;
 
 -- Update custom postcodes table (if exists)
 UPDATE postcodes 
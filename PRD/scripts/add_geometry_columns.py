@@ -3,17 +3,113 @@ Add geometry columns to GNAF tables and populate them with coordinate data.
 This is Step 1 of the geospatial setup.
 """
 
+import argparse
 import psycopg2
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import time
 
 load_dotenv()
 
+# Parallel connections used to populate geom; each updates its own block of heap pages
+GEOMETRY_UPDATE_WORKERS = int(os.getenv('GEOMETRY_UPDATE_WORKERS', 4))
+# server_version_num of the first release with TID range scans (PostgreSQL 14)
+TID_RANGE_SCAN_VERSION = 140000
+# Sort memory for the GiST builds; the 64MB server default spills a 16M-point sort to disk
+INDEX_MAINTENANCE_WORK_MEM = os.getenv('INDEX_MAINTENANCE_WORK_MEM', '1GB')
 
-def add_geometry_columns():
-    """Add and populate geometry columns in GNAF tables."""
+
+def update_geometry_range(conn_params, table, first_page=None, end_page=None):
+    """Populate geom for rows stored in heap pages [first_page, end_page) on a dedicated connection.
+    
+    With no page bounds the whole table is updated in one statement.
+    """
+    conn = psycopg2.connect(**conn_params)
+    # Each range commits on its own, so no single transaction spans the whole table
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET search_path TO gnaf, public;")
+        page_filter = ""
+        params = []
+        if first_page is not None:
+            page_filter += "ctid >= %s::tid AND "
+            params.append(f"({first_page},0)")
+        if end_page is not None:
+            page_filter += "ctid < %s::tid AND "
+            params.append(f"({end_page},0)")
+        cursor.execute(f"""
+            UPDATE {table} 
+            SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
+            WHERE {page_filter}longitude IS NOT NULL 
+              AND latitude IS NOT NULL
+              AND geom IS NULL;
+        """, params or None)
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def geometry_column_kind(cursor, table):
+    """Return None if gnaf.<table> has no geom column, else 'generated' or 'plain'."""
+    cursor.execute("""
+        SELECT is_generated FROM information_schema.columns
+        WHERE table_schema = 'gnaf' AND table_name = %s AND column_name = 'geom';
+    """, (table,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return 'generated' if row[0] == 'ALWAYS' else 'plain'
+
+
+def add_generated_geometry(cursor, table):
+    """Add geom as a stored generated column computed from longitude/latitude.
+    
+    PostgreSQL (12+) fills it for existing rows in the single table rewrite that adds the
+    column, so no UPDATE pass or dead tuples are left behind, and keeps it in step with
+    later inserts and coordinate changes. Unlike CREATE TABLE AS + rename, the table keeps
+    its keys, indexes, grants and dependent views.
+    """
+    cursor.execute(f"""
+        ALTER TABLE {table} 
+        ADD COLUMN geom geometry(Point, 4326)
+        GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)) STORED;
+    """)
+
+
+def populate_geometry(cursor, conn_params, table, workers=GEOMETRY_UPDATE_WORKERS):
+    """Split the geom UPDATE into ctid page ranges run concurrently; returns rows updated.
+    
+    PostgreSQL 14+ answers each range with a TID range scan, so the workers read
+    disjoint parts of the table instead of one backend doing every page. Older servers
+    would scan the whole table for every range, so they get a single UPDATE instead.
+    """
+    if cursor.connection.server_version < TID_RANGE_SCAN_VERSION:
+        return update_geometry_range(conn_params, table)
+    
+    cursor.execute(
+        "SELECT pg_relation_size(%s::regclass) / current_setting('block_size')::int;",
+        (f"gnaf.{table}",)
+    )
+    pages = cursor.fetchone()[0]
+    step = max(1, -(-pages // workers))
+    starts = list(range(0, pages, step)) or [0]
+    # The last range is open-ended so rows in pages added since the size check are still covered
+    ends = starts[1:] + [None]
+    
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(update_geometry_range, conn_params, table, first, end) for first, end in zip(starts, ends)]
+        return sum(future.result() for future in futures)
+
+
+def add_geometry_columns(cluster=False):
+    """Add and populate geometry columns in GNAF tables.
+    
+    With cluster=True, address_default_geocode is also physically reordered along its
+    GiST index so that nearby addresses share heap pages.
+    """
     
     conn_params = {
         'host': os.getenv('DB_HOST', 'localhost'),
@@ -40,66 +136,86 @@ def add_geometry_columns():
         
         # Step 1: Add geometry column to address_default_geocode
         print("[1/6] Adding geometry column to address_default_geocode...")
-        try:
-            cursor.execute("""
-                ALTER TABLE address_default_geocode 
-                ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326);
-            """)
-            conn.commit()
-            print("      ✓ Column added")
-        except Exception as e:
-            print(f"      ℹ {e}")
-            conn.rollback()
+        default_geom = geometry_column_kind(cursor, 'address_default_geocode')
+        start_time = time.time()
+        if default_geom is None:
+            try:
+                add_generated_geometry(cursor, 'address_default_geocode')
+                conn.commit()
+                default_geom = 'generated'
+                elapsed = time.time() - start_time
+                print(f"      ✓ Generated column added and filled in {elapsed:.1f} seconds")
+            except Exception as e:
+                # e.g. PostgreSQL < 12: fall back to a plain column filled by UPDATE below
+                print(f"      ℹ {e}")
+                conn.rollback()
+                cursor.execute("""
+                    ALTER TABLE address_default_geocode 
+                    ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326);
+                """)
+                conn.commit()
+                default_geom = 'plain'
+                print("      ✓ Column added")
+        else:
+            print(f"      ℹ Column already exists ({default_geom})")
         
         # Step 2: Populate geometry in address_default_geocode
         print("\n[2/6] Populating geometry from latitude/longitude...")
         print("      This may take a few minutes for 16+ million records...")
         
         start_time = time.time()
-        cursor.execute("""
-            UPDATE address_default_geocode 
-            SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
-            WHERE longitude IS NOT NULL 
-              AND latitude IS NOT NULL
-              AND geom IS NULL;
-        """)
-        updated = cursor.rowcount
-        conn.commit()
-        elapsed = time.time() - start_time
-        
-        print(f"      ✓ Updated {updated:,} records in {elapsed:.1f} seconds")
+        if default_geom == 'generated':
+            print("      ✓ Already filled by the generated column")
+        else:
+            # Plain column: only fill rows still missing geometry
+            updated = populate_geometry(cursor, conn_params, 'address_default_geocode')
+            conn.commit()
+            elapsed = time.time() - start_time
+            print(f"      ✓ Updated {updated:,} records in {elapsed:.1f} seconds")
         
         # Step 3: Add geometry column to address_site_geocode
         print("\n[3/6] Adding geometry column to address_site_geocode...")
-        try:
-            cursor.execute("""
-                ALTER TABLE address_site_geocode 
-                ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326);
-            """)
-            conn.commit()
-            print("      ✓ Column added")
-        except Exception as e:
-            print(f"      ℹ {e}")
-            conn.rollback()
+        site_geom = geometry_column_kind(cursor, 'address_site_geocode')
+        start_time = time.time()
+        if site_geom is None:
+            try:
+                add_generated_geometry(cursor, 'address_site_geocode')
+                conn.commit()
+                site_geom = 'generated'
+                elapsed = time.time() - start_time
+                print(f"      ✓ Generated column added and filled in {elapsed:.1f} seconds")
+            except Exception as e:
+                # e.g. PostgreSQL < 12: fall back to a plain column filled by UPDATE below
+                print(f"      ℹ {e}")
+                conn.rollback()
+                cursor.execute("""
+                    ALTER TABLE address_site_geocode 
+                    ADD COLUMN IF NOT EXISTS geom geometry(Point, 4326);
+                """)
+                conn.commit()
+                site_geom = 'plain'
+                print("      ✓ Column added")
+        else:
+            print(f"      ℹ Column already exists ({site_geom})")
         
         # Step 4: Populate geometry in address_site_geocode
         print("\n[4/6] Populating geometry in address_site_geocode...")
         
         start_time = time.time()
-        cursor.execute("""
-            UPDATE address_site_geocode 
-            SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)
-            WHERE longitude IS NOT NULL 
-              AND latitude IS NOT NULL
-              AND geom IS NULL;
-        """)
-        updated = cursor.rowcount
-        conn.commit()
-        elapsed = time.time() - start_time
-        
-        print(f"      ✓ Updated {updated:,} records in {elapsed:.1f} seconds")
+        if site_geom == 'generated':
+            print("      ✓ Already filled by the generated column")
+        else:
+            # Plain column: only fill rows still missing geometry
+            updated = populate_geometry(cursor, conn_params, 'address_site_geocode')
+            conn.commit()
+            elapsed = time.time() - start_time
+            print(f"      ✓ Updated {updated:,} records in {elapsed:.1f} seconds")
         
         # Step 5: Create spatial indexes
+        # Session-level, so it applies to both index builds below
+        cursor.execute("SET maintenance_work_mem TO %s;", (INDEX_MAINTENANCE_WORK_MEM,))
+        conn.commit()
+        
         print("\n[5/6] Creating spatial index on address_default_geocode...")
         start_time = time.time()
         try:
@@ -130,6 +246,20 @@ def add_geometry_columns():
             print(f"      ✗ Error: {e}")
             conn.rollback()
         
+        if cluster:
+            print("\n[+] Clustering address_default_geocode on its spatial index...")
+            print("      Rewrites the table under an exclusive lock; queries wait until it finishes")
+            start_time = time.time()
+            try:
+                cursor.execute("CLUSTER address_default_geocode USING idx_address_default_geocode_geom;")
+                cursor.execute("ANALYZE address_default_geocode;")
+                conn.commit()
+                elapsed = time.time() - start_time
+                print(f"      ✓ Table clustered in {elapsed:.1f} seconds")
+            except Exception as e:
+                print(f"      ✗ Error: {e}")
+                conn.rollback()
+        
         # Verify setup
         print("\n" + "="*70)
         print("Verification")
@@ -207,5 +337,10 @@ def add_geometry_columns():
 
 
 if __name__ == "__main__":
-    success = add_geometry_columns()
+    parser = argparse.ArgumentParser(description='Add and populate geometry columns in GNAF tables')
+    parser.add_argument('--cluster', action='store_true',
+                        help='CLUSTER address_default_geocode on its GiST index after building it')
+    args = parser.parse_args()
+    
+    success = add_geometry_columns(cluster=args.cluster)
     sys.exit(0 if success else 1)
@@ -8,12 +8,76 @@ Import School Location 2025 data and update school_profile_2025 with coordinates
 import pandas as pd
 import psycopg2
 from psycopg2 import sql
+from io import StringIO
 from pathlib import Path
 import sys
 import os
 from dotenv import load_dotenv
 
 
+# INT/BIGINT columns; pandas reads them as float when the sheet has blanks, and COPY rejects '2000.0'
+INTEGER_COLUMNS = (
+    'calendar_year', 'acara_sml_id', 'rolled_school_id', 'postcode', 'special_school',
+    'abs_remoteness_area', 'meshblock', 'statistical_area_1', 'statistical_area_2',
+    'statistical_area_3', 'statistical_area_4', 'local_government_area',
+    'state_electoral_division', 'commonwealth_electoral_division',
+)
+
+
+# Excel column names -> gnaf.school_location columns (lowercase with underscores)
+COLUMN_MAPPING = {
+    'Calendar Year': 'calendar_year',
+    'ACARA SML ID': 'acara_sml_id',
+    'Location AGE ID': 'location_age_id',
+    'School AGE ID': 'school_age_id',
+    'Rolled School ID': 'rolled_school_id',
+    'School Name': 'school_name',
+    'Suburb': 'suburb',
+    'State': 'state',
+    'Postcode': 'postcode',
+    'School Sector': 'school_sector',
+    'School Type': 'school_type',
+    'Special school': 'special_school',
+    'Campus Type': 'campus_type',
+    'Latitude': 'latitude',
+    'Longitude': 'longitude',
+    'ABS Remoteness Area': 'abs_remoteness_area',
+    'ABS Remoteness Area Name': 'abs_remoteness_area_name',
+    'Meshblock': 'meshblock',
+    'Statistical Area 1': 'statistical_area_1',
+    'Statistical Area 2': 'statistical_area_2',
+    'Statistical Area 2 Name': 'statistical_area_2_name',
+    'Statistical Area 3': 'statistical_area_3',
+    'Statistical Area 3 Name': 'statistical_area_3_name',
+    'Statistical Area 4': 'statistical_area_4',
+    'Statistical Area 4 Name': 'statistical_area_4_name',
+    'Local Government Area': 'local_government_area',
+    'Local Government Area Name': 'local_government_area_name',
+    'State Electoral Division': 'state_electoral_division',
+    'State Electoral Division Name': 'state_electoral_division_name',
+    'Commonwealth Electoral Division': 'commonwealth_electoral_division',
+    'Commonwealth Electoral Division Name': 'commonwealth_electoral_division_name'
+}
+COLUMNS = list(COLUMN_MAPPING.values())
+
+# Upsert from the COPY staging table in one statement; built once from COLUMNS
+_column_list = sql.SQL(', ').join(map(sql.Identifier, COLUMNS))
+COPY_STAGING_SQL = sql.SQL(
+    "COPY school_location_staging ({}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')"
+).format(_column_list)
+UPSERT_FROM_STAGING_SQL = sql.SQL("""
+    INSERT INTO gnaf.school_location ({columns})
+    SELECT {columns} FROM school_location_staging
+    ON CONFLICT (acara_sml_id) DO UPDATE SET {updates}
+""").format(
+    columns=_column_list,
+    updates=sql.SQL(', ').join(
+        sql.SQL('{0} = EXCLUDED.{0}').format(sql.Identifier(col))
+        for col in COLUMNS if col != 'acara_sml_id'
+    )
+)
+
+
 def connect_to_db(host='localhost', port=5432, database='gnaf_db', user='postgres', password=''):
     """Connect to PostgreSQL database"""
     try:
@@ -79,12 +143,6 @@ def create_school_location_table(conn):
         commonwealth_electoral_division_name VARCHAR(255)
     );
     
-    -- Create index on acara_sml_id for faster lookups
-    CREATE INDEX idx_school_location_acara_sml_id ON gnaf.school_location(acara_sml_id);
-    
-    -- Create spatial index on coordinates
-    CREATE INDEX idx_school_location_coords ON gnaf.school_location(latitude, longitude);
-    
     COMMENT ON TABLE gnaf.school_location IS 'School location data with geographic coordinates and statistical areas';
     COMMENT ON COLUMN gnaf.school_location.acara_sml_id IS 'Unique ID allocated to a school by ACARA (Primary Key)';
     COMMENT ON COLUMN gnaf.school_location.latitude IS 'Geographic latitude coordinate';
@@ -96,7 +154,7 @@ def create_school_location_table(conn):
         cursor.execute(create_table_sql)
         conn.commit()
         cursor.close()
-        print("✓ Created gnaf.school_location table with indexes")
+        print("✓ Created gnaf.school_location table")
         return True
     except psycopg2.Error as e:
         print(f"✗ Error creating table: {e}")
@@ -104,6 +162,29 @@ def create_school_location_table(conn):
         return False
 
 
+def finalize_school_location_indexes(conn):
+    """Create secondary indexes on gnaf.school_location once it is populated"""
+    # acara_sml_id is the primary key, so it already has its own unique index
+    index_sql = """
+    -- Create spatial index on coordinates
+    CREATE INDEX IF NOT EXISTS idx_school_location_coords ON gnaf.school_location(latitude, longitude);
+    
+    ANALYZE gnaf.school_location;
+    """
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute(index_sql)
+        conn.commit()
+        cursor.close()
+        print("✓ Created indexes on gnaf.school_location")
+        return True
+    except psycopg2.Error as e:
+        print(f"✗ Error creating indexes: {e}")
+        conn.rollback()
+        return False
+
+
 def import_school_location_data(conn, excel_file):
     """Import school location data from Excel to PostgreSQL"""
     
@@ -124,100 +205,34 @@ def import_school_location_data(conn, excel_file):
         return 0
     
     # Rename columns to match database schema (lowercase with underscores)
-    column_mapping = {
-        'Calendar Year': 'calendar_year',
-        'ACARA SML ID': 'acara_sml_id',
-        'Location AGE ID': 'location_age_id',
-        'School AGE ID': 'school_age_id',
-        'Rolled School ID': 'rolled_school_id',
-        'School Name': 'school_name',
-        'Suburb': 'suburb',
-        'State': 'state',
-        'Postcode': 'postcode',
-        'School Sector': 'school_sector',
-        'School Type': 'school_type',
-        'Special school': 'special_school',
-        'Campus Type': 'campus_type',
-        'Latitude': 'latitude',
-        'Longitude': 'longitude',
-        'ABS Remoteness Area': 'abs_remoteness_area',
-        'ABS Remoteness Area Name': 'abs_remoteness_area_name',
-        'Meshblock': 'meshblock',
-        'Statistical Area 1': 'statistical_area_1',
-        'Statistical Area 2': 'statistical_area_2',
-        'Statistical Area 2 Name': 'statistical_area_2_name',
-        'Statistical Area 3': 'statistical_area_3',
-        'Statistical Area 3 Name': 'statistical_area_3_name',
-        'Statistical Area 4': 'statistical_area_4',
-        'Statistical Area 4 Name': 'statistical_area_4_name',
-        'Local Government Area': 'local_government_area',
-        'Local Government Area Name': 'local_government_area_name',
-        'State Electoral Division': 'state_electoral_division',
-        'State Electoral Division Name': 'state_electoral_division_name',
-        'Commonwealth Electoral Division': 'commonwealth_electoral_division',
-        'Commonwealth Electoral Division Name': 'commonwealth_electoral_division_name'
-    }
-    
-    df = df.rename(columns=column_mapping)
+    df = df.rename(columns=COLUMN_MAPPING)
     
-    # Replace NaN with None for proper NULL handling
-    df = df.where(pd.notnull(df), None)
-    
-    # Prepare insert statement
-    columns = list(column_mapping.values())
-    placeholders = ', '.join(['%s'] * len(columns))
-    column_names = ', '.join(columns)
-    
-    insert_sql = f"""
-        INSERT INTO gnaf.school_location ({column_names})
-        VALUES ({placeholders})
-        ON CONFLICT (acara_sml_id) DO UPDATE SET
-            calendar_year = EXCLUDED.calendar_year,
-            location_age_id = EXCLUDED.location_age_id,
-            school_age_id = EXCLUDED.school_age_id,
-            rolled_school_id = EXCLUDED.rolled_school_id,
-            school_name = EXCLUDED.school_name,
-            suburb = EXCLUDED.suburb,
-            state = EXCLUDED.state,
-            postcode = EXCLUDED.postcode,
-            school_sector = EXCLUDED.school_sector,
-            school_type = EXCLUDED.school_type,
-            special_school = EXCLUDED.special_school,
-            campus_type = EXCLUDED.campus_type,
-            latitude = EXCLUDED.latitude,
-            longitude = EXCLUDED.longitude,
-            abs_remoteness_area = EXCLUDED.abs_remoteness_area,
-            abs_remoteness_area_name = EXCLUDED.abs_remoteness_area_name,
-            meshblock = EXCLUDED.meshblock,
-            statistical_area_1 = EXCLUDED.statistical_area_1,
-            statistical_area_2 = EXCLUDED.statistical_area_2,
-            statistical_area_2_name = EXCLUDED.statistical_area_2_name,
-            statistical_area_3 = EXCLUDED.statistical_area_3,
-            statistical_area_3_name = EXCLUDED.statistical_area_3_name,
-            statistical_area_4 = EXCLUDED.statistical_area_4,
-            statistical_area_4_name = EXCLUDED.statistical_area_4_name,
-            local_government_area = EXCLUDED.local_government_area,
-            local_government_area_name = EXCLUDED.local_government_area_name,
-            state_electoral_division = EXCLUDED.state_electoral_division,
-            state_electoral_division_name = EXCLUDED.state_electoral_division_name,
-            commonwealth_electoral_division = EXCLUDED.commonwealth_electoral_division,
-            commonwealth_electoral_division_name = EXCLUDED.commonwealth_electoral_division_name
-    """
-    
-    # Insert data in batches
+    # COPY the rows into a staging table, then upsert them in a single INSERT ... SELECT
     cursor = conn.cursor()
-    batch_size = 1000
-    inserted_count = 0
     
     try:
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i + batch_size]
-            values = [tuple(row) for row in batch[columns].values]
-            cursor.executemany(insert_sql, values)
-            inserted_count += len(batch)
-            if inserted_count % 1000 == 0:
-                print(f"  ⏳ Processed {inserted_count}/{len(df)} rows...")
+        # Reloadable from the sheet, so the commit need not wait for the WAL flush
+        cursor.execute("SET LOCAL synchronous_commit TO off")
+        cursor.execute("""
+            CREATE TEMP TABLE school_location_staging
+            (LIKE gnaf.school_location INCLUDING DEFAULTS) ON COMMIT DROP
+        """)
         
+        # One INSERT ... ON CONFLICT cannot touch the same key twice; keep the last row per school,
+        # as the row-by-row upsert did
+        records = df[COLUMNS].drop_duplicates('acara_sml_id', keep='last')
+        for col in INTEGER_COLUMNS:
+            if records[col].dtype.kind == 'f':
+                records = records.assign(**{col: records[col].astype('Int64')})
+        
+        buffer = StringIO()
+        # na_rep='\\N' writes NaN as \N, which COPY reads as NULL (empty strings stay empty)
+        records.to_csv(buffer, index=False, header=False, na_rep='\\N')
+        buffer.seek(0)
+        cursor.copy_expert(COPY_STAGING_SQL, buffer)
+        
+        cursor.execute(UPSERT_FROM_STAGING_SQL)
+        inserted_count = len(records)
         conn.commit()
         print(f"✓ Successfully imported {inserted_count} rows into gnaf.school_location")
         cursor.close()
@@ -235,30 +250,19 @@ def update_school_profile_coordinates(conn):
     
     update_sql = """
     -- First, add latitude and longitude columns if they don't exist
-    DO $$
-    BEGIN
-        IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
-                      WHERE table_schema = 'gnaf' 
-                      AND table_name = 'school_profile_2025' 
-                      AND column_name = 'latitude') THEN
-            ALTER TABLE gnaf.school_profile_2025 ADD COLUMN latitude NUMERIC(10, 7);
-        END IF;
-        
-        IF NOT EXISTS (SELECT 1 FROM information_schema.columns 
-                      WHERE table_schema = 'gnaf' 
-                      AND table_name = 'school_profile_2025' 
-                      AND column_name = 'longitude') THEN
-            ALTER TABLE gnaf.school_profile_2025 ADD COLUMN longitude NUMERIC(10, 7);
-        END IF;
-    END $$;
+    ALTER TABLE gnaf.school_profile_2025
+        ADD COLUMN IF NOT EXISTS latitude NUMERIC(10, 7),
+        ADD COLUMN IF NOT EXISTS longitude NUMERIC(10, 7);
     
-    -- Update coordinates from school_location
+    -- Update coordinates from school_location (only rows whose coordinates changed)
     UPDATE gnaf.school_profile_2025 AS sp
     SET 
         latitude = sl.latitude,
         longitude = sl.longitude
     FROM gnaf.school_location AS sl
-    WHERE sp.acara_sml_id = sl.acara_sml_id;
+    WHERE sp.acara_sml_id = sl.acara_sml_id
+      AND (sp.latitude IS DISTINCT FROM sl.latitude
+           OR sp.longitude IS DISTINCT FROM sl.longitude);
     
     -- Return count of updated rows
     SELECT COUNT(*) 
@@ -335,6 +339,7 @@ def main():
         if imported_count == 0:
             print("Failed to import data. Exiting.")
             sys.exit(1)
+        finalize_school_location_indexes(conn)
         
         # Step 3: Update school_profile_2025
         print("\n🔄 Step 3: Updating school_profile_2025 with coordinates...")
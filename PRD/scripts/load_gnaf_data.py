@@ -4,11 +4,24 @@ Loads suburb-postcode mappings from CSV files into the GNAF database
 """
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 import csv
+import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import sys
 
 
+# Junk data (from web scraping artifacts), matched case-insensitively anywhere in the suburb
+JUNK_KEYWORDS = [
+    'search', 'home', 'territory', 'urban centres', 'time zones',
+    'postcode lists', 'hotels', 'faq', 'contact', 'recently viewed',
+    'sign in', 'register', 'menu'
+]
+JUNK_RE = re.compile('|'.join(map(re.escape, JUNK_KEYWORDS)), re.IGNORECASE)
+POSTCODE_RE = re.compile(r'[0-9]{4}')
+
+
 def connect_to_db(host='localhost', port=5432, database='gnaf_db', user='postgres', password=''):
     """Connect to PostgreSQL database"""
     try:
@@ -39,12 +52,13 @@ def load_suburb_postcode_csv(conn, csv_file, state='NSW'):
     cursor = conn.cursor()
     loaded_count = 0
     skipped_count = 0
+    rows = []
     
     with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+        reader = csv.reader(f)
         
         # Determine column names (handle both 'suburb,postcode' and 'postcode,suburb')
-        fieldnames = reader.fieldnames
+        fieldnames = next(reader, None)
         if not fieldnames:
             print("✗ No header found in CSV")
             return 0
@@ -56,51 +70,63 @@ def load_suburb_postcode_csv(conn, csv_file, state='NSW'):
             print(f"✗ CSV must have 'suburb' and 'postcode' columns. Found: {fieldnames}")
             return 0
         
-        suburb_col = fieldnames[fieldnames_lower.index('suburb')]
-        postcode_col = fieldnames[fieldnames_lower.index('postcode')]
+        # Positional lookups; no per-row dict as with csv.DictReader
+        suburb_idx = fieldnames_lower.index('suburb')
+        postcode_idx = fieldnames_lower.index('postcode')
+        min_length = max(suburb_idx, postcode_idx) + 1
         
         for row in reader:
-            suburb = row.get(suburb_col, '').strip()
-            postcode = row.get(postcode_col, '').strip()
+            # Blank lines (DictReader skipped these too)
+            if not row:
+                continue
             
             # Skip invalid data
+            if len(row) < min_length:
+                skipped_count += 1
+                continue
+            
+            suburb = row[suburb_idx].strip()
+            postcode = row[postcode_idx].strip()
+            
             if not suburb or not postcode:
                 skipped_count += 1
                 continue
             
             # Skip non-numeric postcodes
-            if not postcode.isdigit() or len(postcode) != 4:
+            if not POSTCODE_RE.fullmatch(postcode):
                 skipped_count += 1
                 continue
             
             # Skip junk data (from web scraping artifacts)
-            junk_keywords = [
-                'search', 'home', 'territory', 'urban centres', 'time zones',
-                'postcode lists', 'hotels', 'faq', 'contact', 'recently viewed',
-                'sign in', 'register', 'menu'
-            ]
-            if any(keyword in suburb.lower() for keyword in junk_keywords):
+            if JUNK_RE.search(suburb):
                 skipped_count += 1
                 continue
             
-            try:
-                # Insert into suburb_postcode table
-                cursor.execute("""
-                    INSERT INTO gnaf.suburb_postcode (suburb, postcode, state)
-                    VALUES (%s, %s, %s)
-                    ON CONFLICT (suburb, postcode) DO NOTHING
-                """, (suburb.upper(), postcode, state))
-                
-                if cursor.rowcount > 0:
-                    loaded_count += 1
-                else:
-                    skipped_count += 1
-                    
-            except psycopg2.Error as e:
-                print(f"✗ Error inserting {suburb}, {postcode}: {e}")
-                skipped_count += 1
+            rows.append((suburb.upper(), postcode, state))
+    
+    # Drop duplicates within the file before sending (state is fixed per file, so the tuple is the
+    # (suburb, postcode) key), and insert in key order so concurrent loads of overlapping files
+    # wait on each other instead of deadlocking
+    unique_rows = sorted(set(rows))
+    
+    try:
+        # Insert into suburb_postcode table, 1000 rows per statement;
+        # RETURNING reports only the rows that were not already present
+        inserted = execute_values(cursor, """
+            INSERT INTO gnaf.suburb_postcode (suburb, postcode, state)
+            VALUES %s
+            ON CONFLICT (suburb, postcode) DO NOTHING
+            RETURNING 1
+        """, unique_rows, page_size=1000, fetch=True)
+        loaded_count = len(inserted)
+        skipped_count += len(rows) - loaded_count
+        conn.commit()
+    except psycopg2.Error as e:
+        print(f"✗ Error inserting records: {e}")
+        conn.rollback()
+        cursor.close()
+        return 0
     
-    conn.commit()
     cursor.close()
     
     print(f"✓ Loaded {loaded_count} records")
@@ -109,6 +135,15 @@ def load_suburb_postcode_csv(conn, csv_file, state='NSW'):
     return loaded_count
 
 
+def load_csv_file(db_config, csv_file, state):
+    """Load one CSV file on its own connection (psycopg2 connections are not shared across threads)"""
+    conn = connect_to_db(**db_config)
+    try:
+        return load_suburb_postcode_csv(conn, csv_file, state)
+    finally:
+        conn.close()
+
+
 def load_localities_from_suburb_postcode(conn):
     """Create locality records from suburb_postcode data"""
     print("\nCreating locality records from suburb_postcode data...")
@@ -147,15 +182,12 @@ def show_statistics(conn):
     
     cursor = conn.cursor()
     
-    # Total records
-    cursor.execute("SELECT COUNT(*) FROM gnaf.suburb_postcode")
-    total_mappings = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(DISTINCT suburb) FROM gnaf.suburb_postcode")
-    unique_suburbs = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(DISTINCT postcode) FROM gnaf.suburb_postcode")
-    unique_postcodes = cursor.fetchone()[0]
+    # Total records, unique suburbs and unique postcodes in one scan
+    cursor.execute("""
+        SELECT COUNT(*), COUNT(DISTINCT suburb), COUNT(DISTINCT postcode)
+        FROM gnaf.suburb_postcode
+    """)
+    total_mappings, unique_suburbs, unique_postcodes = cursor.fetchone()
     
     print(f"\nSuburb-Postcode Mappings: {total_mappings}")
     print(f"Unique Suburbs: {unique_suburbs}")
@@ -203,14 +235,16 @@ def main():
     DB_USER = 'postgres'
     DB_PASSWORD = input("Enter PostgreSQL password (or press Enter if none): ").strip()
     
+    db_config = {
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'database': DB_NAME,
+        'user': DB_USER,
+        'password': DB_PASSWORD
+    }
+    
     # Connect to database
-    conn = connect_to_db(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+    conn = connect_to_db(**db_config)
     
     # Load CSV files
     csv_files = [
@@ -218,14 +252,20 @@ def main():
         ('nsw_postcodes_suburbs.csv', 'NSW'),
     ]
     
-    total_loaded = 0
+    existing_files = []
     for csv_file, state in csv_files:
         if Path(csv_file).exists():
-            count = load_suburb_postcode_csv(conn, csv_file, state)
-            total_loaded += count
+            existing_files.append((csv_file, state))
         else:
             print(f"⚠ File not found, skipping: {csv_file}")
     
+    # The loads are bound on database round-trips, so run one file per thread
+    total_loaded = 0
+    if existing_files:
+        with ThreadPoolExecutor(max_workers=len(existing_files)) as executor:
+            counts = executor.map(lambda args: load_csv_file(db_config, *args), existing_files)
+            total_loaded = sum(counts)
+    
     # Create locality records
     if total_loaded > 0:
         load_localities_from_suburb_postcode(conn)
@@ -5,17 +5,58 @@ Automatically finds matching table name, truncates it, and loads the data.
 
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 import pandas as pd
 import os
+import re
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Bytes requested from the PSV file per read while streaming it into COPY
+COPY_BUFFER_SIZE = 1 << 20
+
+# Rows parsed into memory at a time by the pandas INSERT fallback
+PSV_CHUNK_ROWS = 250_000
+
+# maintenance_work_mem for rebuilding indexes after a load into an empty table
+INDEX_MAINTENANCE_WORK_MEM = os.getenv('INDEX_MAINTENANCE_WORK_MEM', '1GB')
+
+# Opt-in: let a server on this machine read PSV files itself (COPY FROM '<path>').
+# Whitespace-only fields are then loaded as-is instead of as NULL.
+SERVER_SIDE_COPY = os.getenv('PSV_SERVER_SIDE_COPY', '').lower() in ('1', 'true', 'yes')
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+# Tables loaded at once in main(), each on its own connection
+PSV_LOAD_WORKERS = int(os.getenv('PSV_LOAD_WORKERS', 4))
+
+# Whitespace-only fields (between delimiters or at a line edge); blanked so COPY loads them as NULL
+BLANK_FIELD_RE = re.compile(r'(?:^|(?<=\|))[ \t]+(?=\||$)', re.MULTILINE)
+
+# Table part of a PSV file stem: Authority_Code_<table>_psv (group 1) or <state>_<table>_psv (group 2)
+TABLE_NAME_RE = re.compile(r'Authority_Code_(.*)_psv|(?!Authority_Code_)[^_]*_(.*)_psv')
+
+
+class BlankFieldReader:
+    """File-like wrapper for copy_expert that blanks whitespace-only fields, whole lines at a time."""
+    
+    def __init__(self, f):
+        self.f = f
+    
+    def read(self, size=-1):
+        # readlines(hint) stops at a line boundary, so no field is split across two reads
+        lines = self.f.readlines(size if size > 0 else -1)
+        return BLANK_FIELD_RE.sub('', ''.join(lines))
+
 
 class PSVLoader:
+    # Column lists by (schema, table); shared by all loaders, as main() opens one loader per table
+    _column_cache = {}
+    
     def __init__(self, host, database, user, password, port=5432):
         """Initialize database connection parameters."""
         self.host = host
@@ -25,6 +66,8 @@ class PSVLoader:
         self.port = port
         self.conn = None
         self.cursor = None
+        self._saved_indexes = {}
+        self._exact_tables = None
     
     def connect(self):
         """Establish database connection."""
@@ -62,19 +105,9 @@ class PSVLoader:
         """
         file_name = Path(file_path).stem  # Get filename without extension
         
-        # Split by underscore
-        parts = file_name.split('_')
-        
-        # Check if format is state_table_psv (but NOT Authority_Code)
-        if len(parts) >= 3 and parts[-1] == 'psv' and not (parts[0] == 'Authority' and parts[1] == 'Code'):
-            # Remove first part (state) and last part (psv)
-            table_parts = parts[1:-1]
-            table_name = '_'.join(table_parts)
-        # Check if format is Authority_Code_<filename>_psv.psv
-        elif len(parts) >= 4 and parts[0] == 'Authority' and parts[1] == 'Code' and parts[-1] == 'psv':
-            # Remove 'Authority_Code' prefix (first 2 parts) and '_psv' suffix (last part)
-            table_parts = parts[2:-1]
-            table_name = '_'.join(table_parts)
+        match = TABLE_NAME_RE.fullmatch(file_name)
+        if match:
+            table_name = match.group(1) if match.group(1) is not None else match.group(2)
         else:
             # Fallback to original behavior if format doesn't match
             table_name = file_name
@@ -84,22 +117,46 @@ class PSVLoader:
         print(f"✓ Extracted table name: {table_name}")
         return table_name
     
+    def prefetch_tables(self, table_names, schema='gnaf'):
+        """
+        Look up exact matches for many extracted table names in one query, so
+        find_matching_table only goes to the database for names that need a partial match.
+        """
+        query = """
+            SELECT tablename
+            FROM pg_catalog.pg_tables
+            WHERE schemaname = %s
+            AND LOWER(tablename) = ANY(%s)
+        """
+        try:
+            self.cursor.execute(query, (schema, [name.lower() for name in table_names]))
+            self._exact_tables = {(schema, row[0].lower()): row[0] for row in self.cursor.fetchall()}
+        except Exception as e:
+            # find_matching_table falls back to one lookup per file
+            print(f"⚠ Could not prefetch table names: {e}")
+            self.conn.rollback()
+    
     def find_matching_table(self, table_name, schema='gnaf'):
         """
         Search for matching table in information_schema.
         Supports exact match or partial match.
+        Exact matches come from prefetch_tables when it has been called.
         """
         try:
             # Try exact match first
-            query = """
-                SELECT table_name, table_schema
-                FROM information_schema.tables
-                WHERE table_schema = %s 
-                AND LOWER(table_name) = LOWER(%s)
-                AND table_type = 'BASE TABLE'
-            """
-            self.cursor.execute(query, (schema, table_name))
-            result = self.cursor.fetchone()
+            if self._exact_tables is not None:
+                exact = self._exact_tables.get((schema, table_name.lower()))
+                result = (exact, schema) if exact else None
+            else:
+                query = """
+                    SELECT table_name, table_schema
+                    FROM information_schema.tables
+                    WHERE table_schema = %s 
+                    AND LOWER(table_name) = LOWER(%s)
+                    AND table_type = 'BASE TABLE'
+                """
+                self.cursor.execute(query, (schema, table_name))
+                result = self.cursor.fetchone()
             
             if result:
                 print(f"✓ Found exact match: {result[1]}.{result[0]}")
@@ -149,22 +206,55 @@ class PSVLoader:
     
     def get_table_columns(self, table_name, schema='public'):
         """Get column names from the table."""
+        key = (schema, table_name)
+        if key in self._column_cache:
+            columns = self._column_cache[key]
+            print(f"✓ Table has {len(columns)} columns")
+            return columns
+        
         try:
+            # pg_attribute directly; information_schema.columns is a much heavier view
             query = """
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_schema = %s 
-                AND table_name = %s
-                ORDER BY ordinal_position
+                SELECT attname
+                FROM pg_attribute
+                WHERE attrelid = %s::regclass
+                AND attnum > 0
+                AND NOT attisdropped
+                ORDER BY attnum
             """
-            self.cursor.execute(query, (schema, table_name))
+            self.cursor.execute(query, (f'{schema}.{table_name}',))
             columns = [row[0] for row in self.cursor.fetchall()]
+            self._column_cache[key] = columns
             print(f"✓ Table has {len(columns)} columns")
             return columns
         except Exception as e:
             print(f"✗ Error getting table columns: {e}")
+            self.conn.rollback()
             return None
     
+    def confirm_columns(self, file_path, table_name, schema='public', encoding='utf-8'):
+        """
+        Compare the file's column count with the table's, asking whether to proceed on a mismatch.
+        Returns False if the file should not be loaded.
+        """
+        with open(file_path, 'r', encoding=encoding) as f:
+            file_columns = f.readline().rstrip('\n').split('|')
+        
+        table_columns = self.get_table_columns(table_name, schema)
+        if not table_columns:
+            return False
+        
+        if len(file_columns) != len(table_columns):
+            print(f"⚠ Warning: Column count mismatch!")
+            print(f"  File has {len(file_columns)} columns")
+            print(f"  Table has {len(table_columns)} columns")
+            
+            # Map columns if user confirms
+            proceed = input("Proceed anyway? (y/n): ")
+            if proceed.lower() != 'y':
+                return False
+        return True
+    
     def truncate_table(self, table_name, schema='public', cascade=False):
         """Truncate the table before loading data."""
         try:
@@ -183,29 +273,138 @@ class PSVLoader:
             self.conn.rollback()
             return False
     
+    def pre_load_tune(self):
+        """Prepare the current transaction for a bulk COPY."""
+        self.cursor.execute("SET LOCAL synchronous_commit TO off")
+    
+    def drop_indexes_for_load(self, table_name, schema='public'):
+        """
+        If the table is empty, drop its secondary indexes so post_load_restore builds them once
+        after all of the table's files are loaded; on a populated table rebuilding them would
+        cost more than the append. Called once per table, before its first file.
+        """
+        try:
+            # Lock before the emptiness check so no other session can load the table in between
+            self.cursor.execute(sql.SQL("LOCK TABLE {}.{} IN SHARE ROW EXCLUSIVE MODE").format(
+                sql.Identifier(schema),
+                sql.Identifier(table_name)
+            ))
+            self.cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {}.{})").format(
+                sql.Identifier(schema),
+                sql.Identifier(table_name)
+            ))
+            if self.cursor.fetchone()[0]:
+                self.conn.commit()
+                return
+            
+            # Non-unique indexes not backing a constraint; unique indexes stay, so duplicate keys
+            # are still rejected during the load
+            self.cursor.execute("""
+                SELECT c.relname, pg_get_indexdef(i.indexrelid)
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE i.indrelid = %s::regclass
+                AND NOT i.indisunique
+                AND NOT EXISTS (SELECT 1 FROM pg_constraint con WHERE con.conindid = i.indexrelid)
+            """, (f'{schema}.{table_name}',))
+            indexes = self.cursor.fetchall()
+            
+            for index_name, _ in indexes:
+                self.cursor.execute(sql.SQL("DROP INDEX {}.{}").format(
+                    sql.Identifier(schema),
+                    sql.Identifier(index_name)
+                ))
+            self.conn.commit()
+            self._saved_indexes[(schema, table_name)] = [index_def for _, index_def in indexes]
+            if indexes:
+                # Logged now so the definitions survive a crash before post_load_restore runs
+                print(f"✓ Dropped {len(indexes)} indexes for the load:")
+                for _, index_def in indexes:
+                    print(f"  {index_def};")
+        except Exception as e:
+            # Loading with the indexes in place is slower but still correct
+            print(f"⚠ Could not drop indexes on {schema}.{table_name}: {e}")
+            self.conn.rollback()
+    
+    def post_load_restore(self, table_name, schema='public'):
+        """Recreate the indexes dropped by drop_indexes_for_load."""
+        index_defs = self._saved_indexes.pop((schema, table_name), [])
+        if not index_defs:
+            return
+        try:
+            self.cursor.execute("SET LOCAL maintenance_work_mem TO %s", (INDEX_MAINTENANCE_WORK_MEM,))
+            for index_def in index_defs:
+                self.cursor.execute(index_def)
+            self.conn.commit()
+            print(f"✓ Recreated {len(index_defs)} indexes")
+        except Exception as e:
+            self.conn.rollback()
+            print(f"✗ Error recreating indexes on {schema}.{table_name}: {e}")
+            print("  Recreate them manually:")
+            for index_def in index_defs:
+                print(f"  {index_def};")
+    
+    def copy_from_server_file(self, file_path, table_name, schema, columns_str, has_header=True):
+        """
+        COPY the file by path on the server, skipping the client-side stream.
+        Only used with PSV_SERVER_SIDE_COPY against a local server, and only if this role may
+        read server files. Returns the row count, or None to fall back to streaming.
+        """
+        if not SERVER_SIDE_COPY or self.host not in LOCAL_HOSTS:
+            return None
+        
+        self.cursor.execute("""
+            SELECT rolsuper OR pg_has_role(current_user, 'pg_read_server_files', 'MEMBER')
+            FROM pg_roles
+            WHERE rolname = current_user
+        """)
+        if not self.cursor.fetchone()[0]:
+            return None
+        
+        copy_sql = sql.SQL("COPY {}.{} ({}) FROM {} WITH (FORMAT CSV, DELIMITER '|', NULL '', HEADER {})").format(
+            sql.Identifier(schema),
+            sql.Identifier(table_name),
+            sql.SQL(columns_str),
+            sql.Literal(str(Path(file_path).resolve())),
+            sql.SQL('true' if has_header else 'false')
+        )
+        # A savepoint keeps the truncate and pre_load_tune's settings if the server cannot open the file
+        self.cursor.execute("SAVEPOINT server_copy")
+        try:
+            self.cursor.execute(copy_sql)
+        except psycopg2.Error as e:
+            print(f"⚠ Server-side COPY failed, streaming the file instead: {e}")
+            self.cursor.execute("ROLLBACK TO SAVEPOINT server_copy")
+            # Back to the top-level transaction, where COPY FREEZE can see the TRUNCATE
+            self.cursor.execute("RELEASE SAVEPOINT server_copy")
+            return None
+        self.cursor.execute("RELEASE SAVEPOINT server_copy")
+        return self.cursor.rowcount
+    
     def load_psv_file(self, file_path, table_name, schema='public', 
-                      has_header=True, encoding='utf-8', batch_size=1000):
+                      has_header=True, encoding='utf-8', batch_size=1000, truncate=False,
+                      columns_confirmed=False):
         """
         Load PSV file into PostgreSQL table using COPY command or INSERT.
+        The file is streamed straight into COPY; pandas is only used for the INSERT fallback.
+        With truncate=True the table is emptied in the same transaction as the load, which
+        lets the streamed COPY use FREEZE (rows are written already frozen, so the first
+        VACUUM does not have to rewrite them).
+        Pass columns_confirmed=True when confirm_columns has already been called for the file
+        (main() does so up front, so worker threads never prompt).
         """
+        truncate_sql = sql.SQL("TRUNCATE TABLE {}.{}").format(
+            sql.Identifier(schema),
+            sql.Identifier(table_name)
+        )
         try:
-            # Read PSV file
+            # Read the first line for the file's columns
             print(f"✓ Reading PSV file: {file_path}")
-            df = pd.read_csv(
-                file_path,
-                sep='|',
-                encoding=encoding,
-                dtype=str,  # Read all as string initially
-                keep_default_na=False  # Don't convert empty strings to NaN
-            )
-            
-            print(f"✓ Loaded {len(df)} rows from PSV file")
-            print(f"✓ File columns: {', '.join(df.columns.tolist())}")
+            with open(file_path, 'r', encoding=encoding) as f:
+                file_columns = f.readline().rstrip('\n').split('|')
             
-            # Convert empty strings to None (NULL in database)
-            # This is especially important for date fields and numeric fields
-            df = df.replace('', None)
-            df = df.replace(r'^\s*$', None, regex=True)  # Also handle whitespace-only values
+            if has_header:
+                print(f"✓ File columns: {', '.join(file_columns)}")
             
             # Get table columns
             table_columns = self.get_table_columns(table_name, schema)
@@ -213,54 +412,67 @@ class PSVLoader:
                 return False
             
             # Check if columns match
-            if len(df.columns) != len(table_columns):
-                print(f"⚠ Warning: Column count mismatch!")
-                print(f"  File has {len(df.columns)} columns")
-                print(f"  Table has {len(table_columns)} columns")
-                
-                # Map columns if user confirms
-                proceed = input("Proceed anyway? (y/n): ")
-                if proceed.lower() != 'y':
-                    return False
+            if not columns_confirmed and not self.confirm_columns(file_path, table_name, schema, encoding):
+                return False
             
             # Use COPY command for better performance
             try:
-                # Create a temporary file-like object
-                from io import StringIO
-                buffer = StringIO()
-                # na_rep='\\N' will write None values as \N which PostgreSQL interprets as NULL
-                df.to_csv(buffer, sep='|', index=False, header=False, na_rep='\\N')
-                buffer.seek(0)
-                
-                # Use COPY command
-                columns_str = ','.join([f'"{col}"' for col in table_columns[:len(df.columns)]])
-                copy_sql = f"COPY {schema}.{table_name} ({columns_str}) FROM STDIN WITH (FORMAT TEXT, DELIMITER '|', NULL '\\N')"
+                # CSV format with NULL '' loads empty (and, via BlankFieldReader, whitespace-only)
+                # fields as NULL - especially important for date fields and numeric fields
+                columns_str = ','.join([f'"{col}"' for col in table_columns[:len(file_columns)]])
+                freeze = ", FREEZE" if truncate else ""
+                copy_sql = f"COPY {schema}.{table_name} ({columns_str}) FROM STDIN WITH (FORMAT CSV, DELIMITER '|', NULL ''{freeze})"
                 
-                self.cursor.copy_expert(copy_sql, buffer)
+                if truncate:
+                    self.cursor.execute(truncate_sql)
+                self.pre_load_tune()
+                loaded_count = self.copy_from_server_file(file_path, table_name, schema, columns_str, has_header)
+                if loaded_count is None:
+                    with open(file_path, 'r', encoding=encoding, buffering=COPY_BUFFER_SIZE) as f:
+                        if has_header:
+                            f.readline()
+                        self.cursor.copy_expert(copy_sql, BlankFieldReader(f), size=COPY_BUFFER_SIZE)
+                    loaded_count = self.cursor.rowcount
                 self.conn.commit()
-                print(f"✓ Loaded {len(df)} rows using COPY command")
+                print(f"✓ Loaded {loaded_count} rows using COPY command")
                 
             except Exception as copy_error:
                 print(f"⚠ COPY command failed: {copy_error}")
                 print(f"⚠ Falling back to INSERT method...")
                 self.conn.rollback()
                 
-                # Fallback to batch INSERT
-                columns_list = table_columns[:len(df.columns)]
-                placeholders = ','.join(['%s'] * len(columns_list))
+                # Parse PSV_CHUNK_ROWS rows at a time so memory stays bounded on large files
+                reader = pd.read_csv(
+                    file_path,
+                    sep='|',
+                    encoding=encoding,
+                    header=0 if has_header else None,
+                    dtype=str,  # Read all as string initially
+                    keep_default_na=False,  # Don't convert empty strings to NaN
+                    chunksize=PSV_CHUNK_ROWS
+                )
+                
+                # The rollback also undid the truncate; redo it as part of the INSERT transaction
+                if truncate:
+                    self.cursor.execute(truncate_sql)
+                
+                # Fallback to multi-row INSERT, batch_size rows per statement
+                columns_list = table_columns[:len(file_columns)]
                 columns_str = ','.join([f'"{col}"' for col in columns_list])
-                insert_sql = f"INSERT INTO {schema}.{table_name} ({columns_str}) VALUES ({placeholders})"
+                insert_sql = f"INSERT INTO {schema}.{table_name} ({columns_str}) VALUES %s"
                 
-                # Insert in batches
+                # Insert in batches, committing once after the last chunk
                 total_inserted = 0
-                for i in range(0, len(df), batch_size):
-                    batch = df.iloc[i:i+batch_size]
-                    # Convert rows to tuples, pandas None will be passed as Python None which psycopg2 converts to NULL
-                    data = [tuple(None if pd.isna(val) else val for val in row) for row in batch.values]
-                    self.cursor.executemany(insert_sql, data)
-                    total_inserted += len(batch)
-                    if i % (batch_size * 10) == 0:
-                        print(f"  Inserted {total_inserted}/{len(df)} rows...")
+                for df in reader:
+                    # Empty and whitespace-only values become NULL in one vectorized pass per column
+                    blank = df.apply(lambda col: col.str.strip().eq(''))
+                    df = df.mask(blank)
+                    
+                    # Convert rows to tuples, NaN is passed as Python None which psycopg2 converts to NULL
+                    data = [tuple(None if pd.isna(val) else val for val in row) for row in df.itertuples(index=False, name=None)]
+                    execute_values(self.cursor, insert_sql, data, page_size=batch_size)
+                    total_inserted += len(data)
+                    print(f"  Inserted {total_inserted} rows...")
                 
                 self.conn.commit()
                 print(f"✓ Loaded {total_inserted} rows using INSERT method")
@@ -273,6 +485,28 @@ class PSVLoader:
             return False
 
 
+def load_psv_job(db_config, table_name, schema, psv_files):
+    """
+    Load one table's PSV files one after another on a dedicated connection
+    (psycopg2 connections are not shared across threads).
+    Indexes on an empty table are dropped before the first file and rebuilt after the last.
+    Returns (psv_file, success) for each file.
+    """
+    loader = PSVLoader(**db_config)
+    loader.connect()
+    try:
+        loader.drop_indexes_for_load(table_name, schema)
+        try:
+            return [
+                (psv_file, loader.load_psv_file(str(psv_file), table_name, schema, columns_confirmed=True))
+                for psv_file in psv_files
+            ]
+        finally:
+            loader.post_load_restore(table_name, schema)
+    finally:
+        loader.close()
+
+
 def main():
     """Main execution function."""
     
@@ -341,10 +575,16 @@ def main():
         # Connect to database
         loader.connect()
         
-        # Process each file
+        # Match each file to its table first (this may prompt), then load the tables in parallel
         total_files = len(files_to_load)
         successful = 0
         failed = 0
+        # Files by (table, schema); the per-state G-NAF files share a table and must not COPY into it at once
+        jobs = {}
+        
+        # Extract every table name up front and resolve the exact matches in one round-trip
+        table_names = {psv_file: loader.get_table_name_from_file(str(psv_file)) for psv_file in files_to_load}
+        loader.prefetch_tables(table_names.values())
         
         for idx, psv_file in enumerate(files_to_load, 1):
             print(f"\n{'='*60}")
@@ -352,8 +592,7 @@ def main():
             print(f"{'='*60}\n")
             
             try:
-                # Extract table name from file
-                table_name = loader.get_table_name_from_file(str(psv_file))
+                table_name = table_names[psv_file]
                 
                 # Find matching table in database
                 matched_table, schema = loader.find_matching_table(table_name)
@@ -364,6 +603,8 @@ def main():
                     continue
                 
                 # TRUNCATE DISABLED - Data will be appended to existing table
+                # (to re-enable, prefer load_psv_file(..., truncate=True) over truncate_table:
+                #  truncating in the load transaction lets COPY use FREEZE)
                 # # Confirm truncate for first file or all files
                 # if idx == 1 or total_files == 1:
                 #     print(f"\n⚠ WARNING: This will TRUNCATE table(s) before loading")
@@ -378,20 +619,41 @@ def main():
                 #     failed += 1
                 #     continue
                 
-                # Load data
-                success = loader.load_psv_file(str(psv_file), matched_table, schema)
-                
-                if success:
-                    print(f"✓ Successfully loaded {psv_file.name}")
-                    successful += 1
-                else:
-                    print(f"✗ Failed to load {psv_file.name}")
+                # Ask about column mismatches here, not from the worker threads
+                if not loader.confirm_columns(str(psv_file), matched_table, schema):
+                    print(f"✗ Skipping {psv_file.name}")
                     failed += 1
+                    continue
+                
+                jobs.setdefault((matched_table, schema), []).append(psv_file)
                     
             except Exception as file_error:
                 print(f"✗ Error processing {psv_file.name}: {file_error}")
                 failed += 1
         
+        # Load data; COPY time is spent in the server, so threads overlap it without GIL contention.
+        # Different tables load in parallel, each table's files one after another on one worker.
+        if jobs:
+            with ThreadPoolExecutor(max_workers=min(PSV_LOAD_WORKERS, len(jobs))) as executor:
+                futures = {
+                    executor.submit(load_psv_job, DB_CONFIG, matched_table, schema, psv_files): psv_files
+                    for (matched_table, schema), psv_files in jobs.items()
+                }
+                for future in as_completed(futures):
+                    try:
+                        results = future.result()
+                    except Exception as file_error:
+                        print(f"✗ Error processing {', '.join(f.name for f in futures[future])}: {file_error}")
+                        results = [(psv_file, False) for psv_file in futures[future]]
+                    
+                    for psv_file, success in results:
+                        if success:
+                            print(f"✓ Successfully loaded {psv_file.name}")
+                            successful += 1
+                        else:
+                            print(f"✗ Failed to load {psv_file.name}")
+                            failed += 1
+        
         # Summary
         print(f"\n{'='*60}")
         print(f"SUMMARY")
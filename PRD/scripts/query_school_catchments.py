@@ -3,9 +3,11 @@ School Catchment Query Examples
 Demonstrates how to query school catchments for GNAF addresses
 """
 
-import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
 import os
+import threading
+import weakref
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -17,14 +19,29 @@ DB_NAME = os.getenv('DB_NAME', 'gnaf_db')
 DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'admin')
 
-def get_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+# Connections are reused across queries instead of reconnecting for every lookup
+POOL_MAX_CONNECTIONS = 8
+_pool = None
+_pool_lock = threading.Lock()
+
+# Lookup statements PREPAREd on each pooled connection (prepared statements live per session)
+_prepared_lookups = weakref.WeakKeyDictionary()
+
+def get_pool():
+    """Shared connection pool, opened on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(
+                minconn=1,
+                maxconn=POOL_MAX_CONNECTIONS,
+                host=DB_HOST,
+                port=DB_PORT,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASSWORD
+            )
+    return _pool
 
 def find_school_catchment_by_coordinates(latitude, longitude, school_type='primary'):
     """
@@ -39,11 +56,11 @@ def find_school_catchment_by_coordinates(latitude, longitude, school_type='prima
         School catchment details or None
     """
     table_name = f'school_catchments_{school_type}'
+    statement = f'catchment_lookup_{school_type}'
     
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    query = f"""
+    # Prepared once per connection, so repeated lookups reuse the parsed query and its plan
+    prepare_query = f"""
+        PREPARE {statement} (float8, float8) AS
         SELECT 
             "USE_ID" as school_id,
             "USE_DESC" as school_name,
@@ -55,18 +72,88 @@ def find_school_catchment_by_coordinates(latitude, longitude, school_type='prima
             "YEAR10" as year10, "YEAR11" as year11, "YEAR12" as year12,
             "PRIORITY" as priority
         FROM {table_name}
-        WHERE ST_Contains(geometry, ST_SetSRID(ST_MakePoint(%s, %s), 4326))
+        WHERE ST_Contains(geometry, ST_SetSRID(ST_MakePoint($1, $2), 4326))
         LIMIT 1
     """
     
-    cursor.execute(query, (longitude, latitude))
-    result = cursor.fetchone()
-    
-    cursor.close()
-    conn.close()
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        prepared = _prepared_lookups.setdefault(conn, set())
+        if statement not in prepared:
+            cursor.execute(prepare_query)
+            prepared.add(statement)
+        cursor.execute(f"EXECUTE {statement} (%s, %s)", (longitude, latitude))
+        result = cursor.fetchone()
+        cursor.close()
+    finally:
+        pool.putconn(conn)
     
     return dict(result) if result else None
 
+def find_school_catchments_bulk(points, school_type='primary'):
+    """
+    Find the school catchment for many coordinates in one query
+    
+    Args:
+        points: List of (latitude, longitude) tuples
+        school_type: 'primary', 'secondary', or 'future'
+    
+    Returns:
+        List of catchment details (or None) in the same order as points
+    """
+    if not points:
+        return []
+    
+    table_name = f'school_catchments_{school_type}'
+    
+    # The points travel as parallel arrays, so N lookups cost one round trip;
+    # the lateral join probes the geometry index once per point, like the single lookup
+    query = f"""
+        SELECT 
+            q.i,
+            sc.*
+        FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS q(lng, lat, i)
+        LEFT JOIN LATERAL (
+            SELECT 
+                "USE_ID" as school_id,
+                "USE_DESC" as school_name,
+                "CATCH_TYPE" as catchment_type,
+                "ADD_DATE" as added_date,
+                "KINDERGART" as kindergart, "YEAR1" as year1, "YEAR2" as year2, "YEAR3" as year3, 
+                "YEAR4" as year4, "YEAR5" as year5, "YEAR6" as year6,
+                "YEAR7" as year7, "YEAR8" as year8, "YEAR9" as year9, 
+                "YEAR10" as year10, "YEAR11" as year11, "YEAR12" as year12,
+                "PRIORITY" as priority
+            FROM {table_name}
+            WHERE ST_Contains(geometry, ST_SetSRID(ST_MakePoint(q.lng, q.lat), 4326))
+            LIMIT 1
+        ) sc ON true
+    """
+    
+    latitudes = [float(lat) for lat, _ in points]
+    longitudes = [float(lng) for _, lng in points]
+    
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(query, (longitudes, latitudes))
+        rows = cursor.fetchall()
+        cursor.close()
+    finally:
+        pool.putconn(conn)
+    
+    # Reassemble by ordinality (1-based); points outside every catchment stay None
+    results = [None] * len(points)
+    for row in rows:
+        row = dict(row)
+        i = row.pop('i')
+        if row['school_id'] is not None:
+            results[i - 1] = row
+    return results
+
 def find_addresses_in_school_catchment(school_name, school_type='primary', limit=20):
     """
     Find all addresses in a specific school catchment
@@ -81,9 +168,6 @@ def find_addresses_in_school_catchment(school_name, school_type='primary', limit
     """
     table_name = f'school_catchments_{school_type}'
     
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
     query = f"""
         SELECT DISTINCT ON (ad.address_detail_pid)
             ad.address_detail_pid as gnaf_id,
@@ -117,28 +201,33 @@ def find_addresses_in_school_catchment(school_name, school_type='primary', limit
         LIMIT %s
     """
     
-    cursor.execute(query, (f'%{school_name}%', limit))
-    results = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(query, (f'%{school_name}%', limit))
+        results = cursor.fetchall()
+        cursor.close()
+    finally:
+        pool.putconn(conn)
     
     return [dict(r) for r in results]
 
 def get_school_catchment_stats():
     """Get statistics about school catchments"""
-    conn = get_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
     stats = {}
     
-    for school_type in ['primary', 'secondary', 'future']:
-        table_name = f'school_catchments_{school_type}'
-        cursor.execute(f"SELECT COUNT(*) as count FROM {table_name}")
-        stats[school_type] = cursor.fetchone()['count']
-    
-    cursor.close()
-    conn.close()
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        for school_type in ['primary', 'secondary', 'future']:
+            table_name = f'school_catchments_{school_type}'
+            cursor.execute(f"SELECT COUNT(*) as count FROM {table_name}")
+            stats[school_type] = cursor.fetchone()['count']
+        cursor.close()
+    finally:
+        pool.putconn(conn)
     
     return stats
 
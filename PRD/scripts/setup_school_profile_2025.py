@@ -9,6 +9,21 @@ import os
 from dotenv import load_dotenv
 
 
+# Secondary indexes (name -> column). They are built by create_indexes after the data is
+# loaded, so the bulk load does not maintain seven B-trees row by row.
+SCHOOL_PROFILE_INDEXES = {
+    'idx_school_profile_2025_school_name': 'school_name',
+    'idx_school_profile_2025_postcode': 'postcode',
+    'idx_school_profile_2025_suburb': 'suburb',
+    'idx_school_profile_2025_state': 'state',
+    'idx_school_profile_2025_school_sector': 'school_sector',
+    'idx_school_profile_2025_school_type': 'school_type',
+    'idx_school_profile_2025_calendar_year': 'calendar_year',
+}
+# Default sort memory for building the indexes above (INDEX_MAINTENANCE_WORK_MEM overrides it)
+DEFAULT_INDEX_MAINTENANCE_WORK_MEM = '1GB'
+
+
 def create_table(conn):
     """Create the school_profile_2025 table"""
     create_table_sql = """
@@ -70,23 +85,12 @@ def create_table(conn):
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
-    
-    -- Create indexes for common queries
-    CREATE INDEX idx_school_profile_2025_school_name ON gnaf.school_profile_2025(school_name);
-    CREATE INDEX idx_school_profile_2025_postcode ON gnaf.school_profile_2025(postcode);
-    CREATE INDEX idx_school_profile_2025_suburb ON gnaf.school_profile_2025(suburb);
-    CREATE INDEX idx_school_profile_2025_state ON gnaf.school_profile_2025(state);
-    CREATE INDEX idx_school_profile_2025_school_sector ON gnaf.school_profile_2025(school_sector);
-    CREATE INDEX idx_school_profile_2025_school_type ON gnaf.school_profile_2025(school_type);
-    CREATE INDEX idx_school_profile_2025_calendar_year ON gnaf.school_profile_2025(calendar_year);
     """
     
     cursor = conn.cursor()
     try:
-        for statement in create_table_sql.split(';'):
-            statement = statement.strip()
-            if statement:
-                cursor.execute(statement)
+        # psycopg2 runs a multi-statement script in one round-trip; no splitting on ';' needed
+        cursor.execute(create_table_sql)
         conn.commit()
         print("✓ Table created successfully")
         return True
@@ -98,6 +102,34 @@ def create_table(conn):
         cursor.close()
 
 
+def drop_indexes(cursor):
+    """Drop the secondary indexes ahead of a bulk load (caller commits)"""
+    for name in SCHOOL_PROFILE_INDEXES:
+        cursor.execute(sql.SQL("DROP INDEX IF EXISTS gnaf.{}").format(sql.Identifier(name)))
+
+
+def create_indexes(conn):
+    """Build the secondary indexes for common queries in one transaction"""
+    cursor = conn.cursor()
+    try:
+        # Read here rather than at import, since main() loads .env; SET LOCAL ends with this transaction
+        work_mem = os.getenv('INDEX_MAINTENANCE_WORK_MEM', DEFAULT_INDEX_MAINTENANCE_WORK_MEM)
+        cursor.execute("SET LOCAL maintenance_work_mem TO %s", (work_mem,))
+        for name, column in SCHOOL_PROFILE_INDEXES.items():
+            cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {} ON gnaf.school_profile_2025({})").format(
+                sql.Identifier(name), sql.Identifier(column)
+            ))
+        conn.commit()
+        print(f"✓ Created {len(SCHOOL_PROFILE_INDEXES)} indexes")
+        return True
+    except psycopg2.Error as e:
+        print(f"✗ Error creating indexes: {e}")
+        conn.rollback()
+        return False
+    finally:
+        cursor.close()
+
+
 def main():
     """Main function"""
     print("=" * 80)